@@ -5,6 +5,7 @@ from appwrite.client import Client
 from appwrite.services.storage import Storage
 import requests
 import PyPDF2
+from catalog import build_issue_index, issue_for_filename
 from typing import List, Dict
 
 def init_firebase():
@@ -100,6 +101,9 @@ def search_pdfs(keyword: str, magazines_data: dict, magazine_issues_data: dict)
     # Create a mapping of magazine IDs to titles
     magazine_titles = {id: data['title'] for id, data in magazines_data.items()}
     
+    # Map each filename to its issue once, instead of scanning every issue per PDF
+    issue_index = build_issue_index(magazines_data, magazine_issues_data)
+    
     # Search through each PDF in the magazines directory
     for filename in os.listdir(magazines_dir):
         if not filename.endswith('.pdf'):
@@ -109,17 +113,13 @@ def search_pdfs(keyword: str, magazines_data: dict, magazine_issues_data: dict)
         
         # Find corresponding magazine issue data
         magazine_id = filename.split('_')[0]
-        issue_data = None
-        magazine_title = "Unknown Magazine"
+        magazine_title = magazine_titles.get(magazine_id, "Unknown Magazine")
         issue_number = "Unknown Issue"
         
-        # Find the issue data that matches this file
-        for issue_id, issue in magazine_issues_data.items():
-            if issue['magazineId'] == magazine_id:
-                issue_data = issue
-                magazine_title = magazine_titles.get(magazine_id, "Unknown Magazine")
-                issue_number = f"Issue {issue['issueNumber']}"
-                break
+        # Keyed lookup on magazine ID and issue number, not just the magazine
+        issue_data = issue_for_filename(issue_index, filename)
+        if issue_data:
+            issue_number = f"Issue {issue_data['issue_number']}"
         
         print(f"\nSearching in: {magazine_title} - {issue_number}")
         
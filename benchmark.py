@@ -0,0 +1,327 @@
+"""
+Offline benchmark for sync, extraction and search.
+
+Generates synthetic magazine PDFs (or uses an existing directory of them),
+serves them from a local HTTP server in place of Appwrite, stubs the Firebase
+catalog, and measures:
+  - extraction throughput (pages/second) for the selected engine
+  - sync_magazines throughput (download + extract + index)
+  - search_pdfs and cached /search latency percentiles per query
+  - peak RSS of this process and its extraction workers
+
+Results are written as JSON. Pass --baseline with an earlier result file to
+fail (exit code 1) when throughput or p95 latency regressed past --tolerance.
+
+    python benchmark.py --pdfs 20 --pages 40 --engine pymupdf --output bench.json
+    python benchmark.py --engine pypdf2 --baseline bench.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Words of the synthetic corpus; a few common ones and a long tail of rare ones
+COMMON_WORDS = "the and of to in for with on laptop review battery screen price issue".split()
+RARE_WORD_COUNT = 5000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sync, extraction and search offline")
+    parser.add_argument("--pdfs", type=int, default=10, help="number of synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=40, help="pages per synthetic PDF")
+    parser.add_argument("--lines", type=int, default=30, help="text lines per page")
+    parser.add_argument("--pdf-dir", help="benchmark these '{magazineId}_{issueNumber}.pdf' files instead of generating")
+    parser.add_argument("--engine", default=os.getenv('PDF_ENGINE', 'pymupdf'), help="PDF engine: pymupdf or pypdf2")
+    parser.add_argument("--workers", type=int, help="extraction worker processes (default: EXTRACT_WORKERS)")
+    parser.add_argument("--iterations", type=int, default=50, help="timed runs per search query")
+    parser.add_argument("--limit", type=int, default=20, help="page size used for searches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="keep generated files here instead of a temporary directory")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression against the baseline")
+    return parser.parse_args()
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size so far for this process and its (finished) children"""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def generate_pdfs(directory: str, count: int, pages: int, lines: int, rng: random.Random) -> List[str]:
+    """Write `count` synthetic PDFs named '{magazineId}_{issueNumber}.pdf' and return their filenames"""
+    import pymupdf
+
+    rare_words = [f"w{i:04d}x" for i in range(RARE_WORD_COUNT)]
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for i in range(count):
+        filename = f"{1000 + i % 5}_{i // 5 + 1}.pdf"
+        doc = pymupdf.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            y = 40
+            for _ in range(lines):
+                words = [
+                    rng.choice(COMMON_WORDS) if rng.random() < 0.6 else rng.choice(rare_words)
+                    for _ in range(10)
+                ]
+                page.insert_text((40, y), ' '.join(words), fontsize=9)
+                y += 24
+        doc.save(os.path.join(directory, filename))
+        doc.close()
+        filenames.append(filename)
+    return filenames
+
+
+def serve_directory(directory: str) -> ThreadingHTTPServer:
+    """Serve `directory` over HTTP on a free local port, standing in for Appwrite storage"""
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, name="bench-storage", daemon=True).start()
+    return server
+
+
+def stub_firebase(filenames: List[str]):
+    """Replace the Firebase app and database with an in-memory catalog of the given PDFs"""
+    import firebase_admin
+    from firebase_admin import credentials, db
+    from google.auth.credentials import AnonymousCredentials
+
+    class StubCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    magazines = {}
+    magazine_issues = {}
+    for filename in filenames:
+        magazine_id, issue_number = filename[:-len('.pdf')].split('_')
+        magazines[magazine_id] = {'title': f"Magazine {magazine_id}"}
+        # The Appwrite file ID is the filename, so the stub storage can serve it directly
+        magazine_issues[f"issue-{magazine_id}-{issue_number}"] = {
+            'magazineId': magazine_id,
+            'issueNumber': issue_number,
+            'pdfFileId': filename
+        }
+    trees = {'magazines': magazines, 'magazine_issues': magazine_issues}
+
+    class StubReference:
+        def __init__(self, path):
+            self.path = path.strip('/')
+
+        def get(self, etag=False, shallow=False):
+            data = trees.get(self.path)
+            return (data, 'bench') if etag else data
+
+        def get_if_changed(self, etag):
+            return etag != 'bench', trees.get(self.path), 'bench'
+
+    if not len(firebase_admin._apps):
+        firebase_admin.initialize_app(StubCredential(), {'databaseURL': 'https://bench.invalid'})
+    db.reference = lambda path='/', app=None, url=None: StubReference(path)
+
+
+def bench_extraction(source_dir: str, filenames: List[str], workers) -> Dict:
+    from pdf_text import engine_name, iter_extract
+
+    paths = [os.path.join(source_dir, filename) for filename in filenames]
+    files = pages = 0
+    started = time.perf_counter()
+    # Stream the results like the cache does, so memory reflects the real pipeline
+    for kind, _, value in iter_extract(paths, workers):
+        if kind == 'pages':
+            pages += len(value)
+        elif kind == 'done':
+            files += 1
+    seconds = time.perf_counter() - started
+    return {
+        "engine": engine_name(),
+        "files": files,
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def bench_sync(index, source_dir: str) -> Dict:
+    total_bytes = sum(os.path.getsize(os.path.join(source_dir, name)) for name in os.listdir(source_dir))
+    started = time.perf_counter()
+    stats = index.sync_magazines()
+    seconds = time.perf_counter() - started
+    with index.search_index._connect() as conn:
+        pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+    return {
+        "downloads": stats["new_downloads"],
+        "pages_indexed": pages,
+        "seconds": round(seconds, 3),
+        "issues_per_second": round(stats["new_downloads"] / seconds, 2) if seconds else 0.0,
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+        "megabytes_per_second": round(total_bytes / 1024 / 1024 / seconds, 2) if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def bench_search(index, queries: List[str], iterations: int, limit: int) -> Dict:
+    results = {}
+    for query in queries:
+        # Warm up SQLite's page cache so runs measure steady-state latency
+        total, _ = index.search_pdfs(query, limit)
+        uncached = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            index.search_pdfs(query, limit)
+            uncached.append(time.perf_counter() - started)
+        # The first call fills the result cache; timed runs measure hits
+        index.cached_search_response(query, limit, 0)
+        cached = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            index.cached_search_response(query, limit, 0)
+            cached.append(time.perf_counter() - started)
+        results[query] = {
+            "total_matches": total,
+            "search_pdfs": percentiles(uncached),
+            "cached_response": percentiles(cached)
+        }
+    return results
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Describe every metric that regressed by more than `tolerance` against the baseline"""
+    regressions = []
+    for section in ("extraction", "sync"):
+        old = baseline.get(section, {}).get("pages_per_second")
+        new = result[section]["pages_per_second"]
+        if old and new < old * (1 - tolerance):
+            regressions.append(f"{section} pages/s {new} < baseline {old}")
+    for query, stats in result["search"].items():
+        old = baseline.get("search", {}).get(query, {}).get("search_pdfs", {}).get("p95_ms")
+        new = stats["search_pdfs"]["p95_ms"]
+        if old and new > old * (1 + tolerance):
+            regressions.append(f"search '{query}' p95 {new}ms > baseline {old}ms")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="magazine-bench-")
+    source_dir = args.pdf_dir or os.path.join(workdir, 'source')
+
+    # Settings are read at import time, so the environment is prepared before importing the app
+    os.environ['MAGAZINES_DIR'] = os.path.join(workdir, 'magazines')
+    os.environ['INDEX_DIR'] = os.path.join(workdir, 'index')
+    # Start from an empty index even if a snapshot ships in the working directory
+    os.environ['INDEX_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshot')
+    os.environ['INDEX_SNAPSHOT_URL'] = ''
+    os.environ['PDF_ENGINE'] = args.engine
+    os.environ['SYNC_INTERVAL_SECONDS'] = '0'
+    os.environ.setdefault('FIREBASE_ADMIN_CONFIG', '{}')
+    if args.workers:
+        os.environ['EXTRACT_WORKERS'] = str(args.workers)
+    for directory in (os.environ['MAGAZINES_DIR'], os.environ['INDEX_DIR']):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    try:
+        if args.pdf_dir:
+            filenames = sorted(name for name in os.listdir(source_dir) if name.endswith('.pdf'))
+        else:
+            print(f"Generating {args.pdfs} PDFs of {args.pages} pages in {source_dir}", file=sys.stderr)
+            filenames = generate_pdfs(source_dir, args.pdfs, args.pages, args.lines, rng)
+
+        server = serve_directory(source_dir)
+        stub_firebase(filenames)
+
+        import index
+        # No lifespan runs here, so open the index as the server would on startup
+        index.open_index()
+        port = server.server_address[1]
+        index.magazine_download_url = lambda bucket_id, file_id: f"http://127.0.0.1:{port}/{file_id}"
+
+        result = {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "pdfs": len(filenames),
+                "pages": args.pages if not args.pdf_dir else None,
+                "lines": args.lines if not args.pdf_dir else None,
+                "engine": args.engine,
+                "workers": args.workers,
+                "iterations": args.iterations,
+                "limit": args.limit
+            }
+        }
+
+        print("Measuring extraction", file=sys.stderr)
+        result["extraction"] = bench_extraction(source_dir, filenames, args.workers)
+
+        print("Measuring sync", file=sys.stderr)
+        result["sync"] = bench_sync(index, source_dir)
+
+        print("Measuring search", file=sys.stderr)
+        queries = ["laptop", "w0042x", "battery screen", '"laptop review"', "bat*", "laptpo~", "missing"]
+        result["search"] = bench_search(index, queries, args.iterations, args.limit)
+        result["peak_rss_mb"] = peak_rss_mb()
+        server.shutdown()
+
+        regressions = []
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(result, json.load(f), args.tolerance)
+            result["regressions"] = regressions
+
+        output = json.dumps(result, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+        else:
+            print(output)
+
+        for regression in regressions:
+            print(f"✗ Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import metrics
+from clients import init_firebase
+from settings import CATALOG_TTL_SECONDS
+
+CATALOG_PATHS = ('magazines', 'magazine_issues')
+
+
+def issue_key(magazine_id, issue_number) -> str:
+    """Key shared by filenames and lookups: '{magazineId}_{issueNumber}'"""
+    return f"{magazine_id}_{issue_number}"
+
+
+def build_issue_index(magazines: Dict, magazine_issues: Dict) -> Dict[str, Dict]:
+    """
+    Map '{magazineId}_{issueNumber}' (a PDF filename without '.pdf') to the
+    metadata of that issue, so per-file lookups are O(1) instead of a scan.
+    """
+    return {
+        issue_key(issue['magazineId'], issue['issueNumber']): {
+            'issue_id': issue_id,
+            'file_id': issue['pdfFileId'],
+            'magazine_id': issue['magazineId'],
+            'issue_number': issue['issueNumber'],
+            'magazine_title': (magazines.get(issue['magazineId']) or {}).get('title', "Unknown Magazine")
+        }
+        for issue_id, issue in magazine_issues.items()
+        if 'pdfFileId' in issue
+    }
+
+
+def issue_for_filename(issue_index: Dict[str, Dict], filename: str) -> Optional[Dict]:
+    """Look up the issue metadata for a '{magazineId}_{issueNumber}.pdf' filename"""
+    if filename.endswith('.pdf'):
+        filename = filename[:-len('.pdf')]
+    return issue_index.get(filename)
+
+
+class CatalogSnapshot:
+    """Immutable view of the Firebase catalog with precomputed lookups"""
+
+    def __init__(self, magazines: Dict, magazine_issues: Dict, fetched_at: float, version: int = 1):
+        self.magazines = magazines
+        self.magazine_issues = magazine_issues
+        self.fetched_at = fetched_at
+        # Only moves when the data changed, so revalidated snapshots keep their version
+        self.version = version
+        self.titles = {id: data['title'] for id, data in magazines.items()}
+        self.issues_by_key = build_issue_index(magazines, magazine_issues)
+
+    def issue(self, magazine_id, issue_number) -> Optional[Dict]:
+        """Return the metadata of a magazine issue"""
+        return self.issues_by_key.get(issue_key(magazine_id, issue_number))
+
+    def age_seconds(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class CatalogCache:
+    """
+    In-process cache of the magazines/magazine_issues trees.
+    Snapshots are served for `ttl` seconds; after that they are revalidated
+    with the ETag from the previous fetch, so unchanged trees are not
+    downloaded again. Expired snapshots keep being served while a single
+    background refresh runs; callers only block when there is no snapshot yet.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._etags: Dict[str, str] = {}
+        # Held across the Firebase round-trips; the request path never waits on it
+        self._lock = threading.Lock()
+        self._refreshing_lock = threading.Lock()
+        self._refreshing = False
+        self._expired = False
+
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, revalidating it in the background once it expires"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        if self._expired or snapshot.age_seconds() >= self.ttl:
+            self._refresh_in_background()
+        return snapshot
+
+    def refresh(self) -> CatalogSnapshot:
+        """Revalidate both trees now and return the resulting snapshot"""
+        # Imported here so the Firebase SDK only loads once the catalog is needed
+        from firebase_admin import db
+
+        init_firebase()
+        with self._lock, metrics.span('catalog_fetch'):
+            current = self._snapshot
+            trees = {}
+            changed_any = False
+            for path in CATALOG_PATHS:
+                reference = db.reference(path)
+                etag = self._etags.get(path)
+                if current is not None and etag is not None:
+                    changed, data, etag = reference.get_if_changed(etag)
+                    trees[path] = (data or {}) if changed else getattr(current, path)
+                else:
+                    changed = True
+                    data, etag = reference.get(etag=True)
+                    trees[path] = data or {}
+                changed_any = changed_any or changed
+                self._etags[path] = etag
+            if current is None:
+                version = 1
+            else:
+                version = current.version + 1 if changed_any else current.version
+            self._snapshot = CatalogSnapshot(trees['magazines'], trees['magazine_issues'], time.time(), version)
+            self._expired = False
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to revalidate against Firebase"""
+        self._expired = True
+
+    def _refresh_in_background(self):
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Catalog refresh failed: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="catalog-refresh", daemon=True).start()
@@ -0,0 +1,35 @@
+import json
+import os
+import threading
+
+# Firebase Realtime Database holding the magazine catalog
+FIREBASE_DATABASE_URL = 'https://magazine-nexus-default-rtdb.asia-southeast1.firebasedatabase.app'
+
+# Appwrite project and bucket the magazine PDFs are stored in
+APPWRITE_ENDPOINT = 'https://cloud.appwrite.io/v1'
+APPWRITE_PROJECT = '676fc20b003ccf154826'
+APPWRITE_BUCKET = '67718396003a69711df7'
+
+# The Firebase SDK is slow to import, so it is loaded on first use rather than at startup
+_lock = threading.Lock()
+
+
+def init_firebase():
+    """Initialize the Firebase app from FIREBASE_ADMIN_CONFIG unless it already is"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _lock:
+        if not len(firebase_admin._apps):
+            config = os.getenv('FIREBASE_ADMIN_CONFIG')
+            if not config:
+                raise ValueError("FIREBASE_ADMIN_CONFIG environment variable is not set")
+            cred = credentials.Certificate(json.loads(config))
+            firebase_admin.initialize_app(cred, {
+                'databaseURL': FIREBASE_DATABASE_URL
+            })
+
+
+def download_url(file_id: str, bucket_id: str = APPWRITE_BUCKET) -> str:
+    """Build the Appwrite download URL for a stored file without loading the SDK"""
+    return f"{APPWRITE_ENDPOINT}/storage/buckets/{bucket_id}/files/{file_id}/download?project={APPWRITE_PROJECT}"
@@ -0,0 +1,145 @@
+"""
+Flat, memory-mapped copy of the indexed text for substring scans.
+
+Every indexed line is stored lowercased and UTF-8 encoded in one blob, one line
+per '\\n'-terminated record, in file/page/line order. An offset table maps each
+record back to its (doc_id, page_number, line_number), and a document table
+gives each document's contiguous run of records. A scan is a sequence of
+mmap.find() calls over the blob, so no per-line Python strings are created,
+and the file is opened read-only so every worker shares it through the page cache.
+
+File layout (little-endian int64 unless noted):
+    header      MAGIC, corpus version, line count, document count, blob offset, blob length
+    blob        the lowercased lines, each followed by '\\n'
+    starts      byte offset of each line within the blob
+    doc_ids     document of each line
+    pages       page number of each line
+    lines       line number of each line
+    documents   (doc_id, first line, end line) per document
+"""
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from typing import Iterator, Optional, Tuple
+
+MAGIC = b'MAGCORP1'
+HEADER = struct.Struct('<8s5q')
+
+# Lines encode lone surrogates from broken PDF text instead of failing on them
+_ENCODING_ERRORS = 'surrogatepass'
+
+
+def build_corpus(conn: sqlite3.Connection, path: str) -> int:
+    """
+    Write the corpus file for the index behind conn, replacing any previous one
+    atomically. The version and the lines are read in one transaction so they
+    always agree. Returns the corpus version written.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.corpus.', suffix='.part')
+    starts, doc_ids, pages, lines = array('q'), array('q'), array('q'), array('q')
+    documents = array('q')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\0' * HEADER.size)
+            conn.execute('BEGIN')
+            row = conn.execute("SELECT value FROM meta WHERE key = 'corpus_version'").fetchone()
+            version = int(row[0]) if row else 0
+            rows = conn.execute(
+                'SELECT l.doc_id, l.page_number, l.line_number, l.text '
+                'FROM lines l JOIN documents d USING (doc_id) '
+                'ORDER BY d.filename, l.page_number, l.line_number'
+            )
+            offset = 0
+            for doc_id, page_number, line_number, text in rows:
+                if not doc_ids or doc_ids[-1] != doc_id:
+                    if doc_ids:
+                        documents.append(len(doc_ids))
+                    documents.extend((doc_id, len(doc_ids)))
+                record = text.lower().encode('utf-8', _ENCODING_ERRORS) + b'\n'
+                f.write(record)
+                starts.append(offset)
+                doc_ids.append(doc_id)
+                pages.append(page_number)
+                lines.append(line_number)
+                offset += len(record)
+            conn.execute('COMMIT')
+            if doc_ids:
+                documents.append(len(doc_ids))
+
+            # Pad so the int64 tables are aligned for memoryview.cast
+            f.write(b'\0' * (-(HEADER.size + offset) % 8))
+            for table in (starts, doc_ids, pages, lines, documents):
+                f.write(table.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, version, len(doc_ids), len(documents) // 3, HEADER.size, offset))
+        # mkstemp creates owner-only files; other workers may run as other users
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+        return version
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class Corpus:
+    """A read-only mapping of a corpus file built by build_corpus"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, count, doc_count, self._blob_start, blob_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a corpus file")
+        self._blob_end = self._blob_start + blob_length
+        tables_start = self._blob_end + (-self._blob_end % 8)
+        tables = memoryview(self._map)[tables_start:].cast('q')
+        self.starts = tables[0:count]
+        self.doc_ids = tables[count:2 * count]
+        self.pages = tables[2 * count:3 * count]
+        self.lines = tables[3 * count:4 * count]
+        documents = tables[4 * count:4 * count + 3 * doc_count]
+        self.documents = {documents[i]: (documents[i + 1], documents[i + 2]) for i in range(0, len(documents), 3)}
+
+    @classmethod
+    def open(cls, path: str) -> Optional['Corpus']:
+        """Map the corpus file, or return None if it is missing or unreadable"""
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def find(self, keyword: str, doc_id: Optional[int] = None) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield (doc_id, page_number, line_number) for every line containing the
+        lowercased keyword, in file/page/line order. Passing doc_id restricts
+        the scan to that document's lines.
+        """
+        if '\n' in keyword:
+            return
+        needle = keyword.encode('utf-8', _ENCODING_ERRORS)
+        first, end = 0, len(self.starts)
+        if doc_id is not None:
+            first, end = self.documents.get(doc_id, (0, 0))
+        if first >= end:
+            return
+        starts = self.starts
+        position = self._blob_start + starts[first]
+        limit = self._blob_end if end == len(starts) else self._blob_start + starts[end]
+        while True:
+            found = self._map.find(needle, position, limit)
+            if found < 0:
+                return
+            i = bisect_right(starts, found - self._blob_start, first, end) - 1
+            yield self.doc_ids[i], self.pages[i], self.lines[i]
+            if i + 1 >= end:
+                return
+            # One hit per line: continue from the start of the next line
+            position = self._blob_start + starts[i + 1]
@@ -3,9 +3,11 @@ import firebase_admin
 from firebase_admin import credentials, db
 from appwrite.client import Client
 from appwrite.services.storage import Storage
-import requests
-import PyPDF2
-from typing import List, Dict
+from catalog import build_issue_index, issue_for_filename
+from typing import List, Dict, Tuple
+from downloader import download_many
+from pdf_text import engine_stats, split_lines
+from text_cache import cache_many, iter_page_texts
 
 def init_firebase():
     """Initialize Firebase with credentials"""
@@ -45,40 +47,33 @@ def init_appwrite():
         print(f"✗ Appwrite initialization failed: {str(e)}")
         raise
 
-def download_magazine(client, bucket_id, file_id, filename):
-    """Download a single magazine if it doesn't exist locally"""
-    print(f"\n=== Processing {filename} ===")
-    
-    # Create magazines directory
+def download_magazines(client, bucket_id, issues: List[Tuple[str, str]]):
+    """Download (file_id, filename) issues that don't exist locally, several at a time"""
     magazines_dir = "magazines"
-    if not os.path.exists(magazines_dir):
-        print(f"Creating directory: {magazines_dir}")
-        os.makedirs(magazines_dir)
-    
-    # Check if file exists
-    file_path = os.path.join(magazines_dir, filename)
-    if os.path.exists(file_path):
-        print(f"✓ Magazine already exists at: {file_path}")
-        return
-    
-    # Generate download URL
     project_id = '676fc20b003ccf154826'  # Your project ID
-    download_url = f"{client._endpoint}/storage/buckets/{bucket_id}/files/{file_id}/download?project={project_id}"
-    print(f"Download URL: {download_url}")
     
-    # Download the file
-    print("Downloading magazine...")
-    response = requests.get(download_url)
-    print(f"Response status code: {response.status_code}")
+    jobs = []
+    for file_id, filename in issues:
+        file_path = os.path.join(magazines_dir, filename)
+        if os.path.exists(file_path):
+            print(f"✓ Magazine already exists at: {file_path}")
+            continue
+        
+        # Generate download URL
+        download_url = f"{client._endpoint}/storage/buckets/{bucket_id}/files/{file_id}/download?project={project_id}"
+        print(f"Queued {filename}: {download_url}")
+        jobs.append((download_url, file_path))
     
-    if response.status_code == 200:
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-            
-        print(f"✓ Successfully downloaded to: {file_path}")
-    else:
-        print(f"✗ Download failed. Status code: {response.status_code}")
-        print(f"Error response: {response.text}")
+    if not jobs:
+        return
+    
+    # Stream the files concurrently; each lands under its final name only when complete
+    print(f"\n=== Downloading {len(jobs)} magazines ===")
+    for file_path, ok in download_many(jobs).items():
+        if ok:
+            print(f"✓ Successfully downloaded to: {file_path}")
+        else:
+            print(f"✗ Download failed for: {file_path}")
 
 def search_pdfs(keyword: str, magazines_data: dict, magazine_issues_data: dict) -> List[Dict]:
     """
@@ -100,55 +95,52 @@ def search_pdfs(keyword: str, magazines_data: dict, magazine_issues_data: dict)
     # Create a mapping of magazine IDs to titles
     magazine_titles = {id: data['title'] for id, data in magazines_data.items()}
     
+    # Map each filename to its issue once, instead of scanning every issue per PDF
+    issue_index = build_issue_index(magazines_data, magazine_issues_data)
+    
+    # Extract any uncached PDFs across the process pool up front
+    filenames = sorted(filename for filename in os.listdir(magazines_dir) if filename.endswith('.pdf'))
+    cached = cache_many([os.path.join(magazines_dir, filename) for filename in filenames])
+    
     # Search through each PDF in the magazines directory
-    for filename in os.listdir(magazines_dir):
-        if not filename.endswith('.pdf'):
-            continue
-            
+    for filename in filenames:
         file_path = os.path.join(magazines_dir, filename)
         
         # Find corresponding magazine issue data
         magazine_id = filename.split('_')[0]
-        issue_data = None
-        magazine_title = "Unknown Magazine"
+        magazine_title = magazine_titles.get(magazine_id, "Unknown Magazine")
         issue_number = "Unknown Issue"
         
-        # Find the issue data that matches this file
-        for issue_id, issue in magazine_issues_data.items():
-            if issue['magazineId'] == magazine_id:
-                issue_data = issue
-                magazine_title = magazine_titles.get(magazine_id, "Unknown Magazine")
-                issue_number = f"Issue {issue['issueNumber']}"
-                break
+        # Keyed lookup on magazine ID and issue number, not just the magazine
+        issue_data = issue_for_filename(issue_index, filename)
+        if issue_data:
+            issue_number = f"Issue {issue_data['issue_number']}"
         
         print(f"\nSearching in: {magazine_title} - {issue_number}")
         
+        if file_path not in cached:
+            print(f"✗ Error processing {magazine_title} - {issue_number}: could not extract text")
+            continue
+        
         try:
-            with open(file_path, 'rb') as file:
-                # Create PDF reader object
-                pdf_reader = PyPDF2.PdfReader(file)
+            # Page text streams from the cache one page at a time; only new or modified PDFs are parsed
+            for page_num, text in enumerate(iter_page_texts(file_path)):
+                # Process text line by line
+                text_lines = split_lines(text)
                 
-                # Search each page
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    
-                    # Process text line by line
-                    text_lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    
-                    for line_num, line in enumerate(text_lines):
-                        # Case insensitive search in cleaned line
-                        if keyword in line.lower().strip():
-                            result = {
-                                'magazine_title': magazine_title,
-                                'issue_number': issue_number,
-                                'page_number': page_num + 1,
-                                'line_number': line_num + 1,
-                                'context': line.strip()
-                            }
-                            results.append(result)
-                            print(f"✓ Found in page {page_num + 1}, line {line_num + 1}:")
-                            print(f"  {line.strip()}")
+                for line_num, line in enumerate(text_lines):
+                    # Case insensitive search in cleaned line
+                    if keyword in line.lower().strip():
+                        result = {
+                            'magazine_title': magazine_title,
+                            'issue_number': issue_number,
+                            'page_number': page_num + 1,
+                            'line_number': line_num + 1,
+                            'context': line.strip()
+                        }
+                        results.append(result)
+                        print(f"✓ Found in page {page_num + 1}, line {line_num + 1}:")
+                        print(f"  {line.strip()}")
                 
         except Exception as e:
             print(f"✗ Error processing {magazine_title} - {issue_number}: {str(e)}")
@@ -169,6 +161,10 @@ def search_pdfs(keyword: str, magazines_data: dict, magazine_issues_data: dict)
     else:
         print(f"\n=== No matches found for '{keyword}' ===")
     
+    # Extraction throughput, to compare engines on this corpus
+    for engine, stats in engine_stats().items():
+        print(f"\n[{engine}] {stats['pages']} pages in {stats['seconds']}s ({stats['pages_per_second']} pages/s)")
+    
     return results
 
 def main():
@@ -196,6 +192,7 @@ def main():
         print(f"✓ Found {len(magazine_issues_data)} magazine issues in the database")
         
         # Process each magazine
+        issues = []
         for issue_id, issue_data in magazine_issues_data.items():
             print(f"\n--- Processing Issue ID: {issue_id} ---")
             if 'pdfFileId' in issue_data and issue_data['pdfFileId']:
@@ -204,15 +201,16 @@ def main():
                 print(f"Magazine: {magazine_title}")
                 print(f"Issue Number: {issue_data['issueNumber']}")
                 print(f"PDF File ID: {issue_data['pdfFileId']}")
-                download_magazine(
-                    client=client,
-                    bucket_id='67718396003a69711df7',
-                    file_id=issue_data['pdfFileId'],
-                    filename=filename
-                )
+                issues.append((issue_data['pdfFileId'], filename))
             else:
                 print("✗ No PDF file ID found for this issue")
         
+        download_magazines(
+            client=client,
+            bucket_id='67718396003a69711df7',
+            issues=issues
+        )
+        
         # Example search
         keyword = input("\nEnter search keyword: ")
         search_results = search_pdfs(keyword, magazines_data, magazine_issues_data)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+import metrics
+from settings import DOWNLOAD_CONCURRENCY, MAX_PDF_BYTES
+
+# Bytes read from the response per write
+CHUNK_SIZE = 1024 * 1024
+
+def new_http_client(concurrency: int = DOWNLOAD_CONCURRENCY) -> httpx.Client:
+    """Create a pooled HTTP client sized for `concurrency` parallel downloads"""
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=httpx.Timeout(30.0, read=120.0),
+        follow_redirects=True
+    )
+
+def download_file(http: httpx.Client, url: str, file_path: str, max_bytes: int = MAX_PDF_BYTES) -> bool:
+    """
+    Stream `url` into `file_path`, one chunk in memory at a time.
+    The body is written to a hidden '.part' file in the same directory and
+    renamed into place only once complete, so readers never see partial PDFs.
+    Bodies larger than `max_bytes` are abandoned.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with http.stream('GET', url) as response:
+                if response.status_code != 200:
+                    print(f"Download failed for {os.path.basename(file_path)}: status {response.status_code}")
+                    metrics.inc('magazine_downloads_total', result='failed')
+                    return False
+                declared = int(response.headers.get('content-length') or 0)
+                if declared > max_bytes:
+                    print(f"Download skipped for {os.path.basename(file_path)}: {declared} bytes is over the {max_bytes} byte limit")
+                    metrics.inc('magazine_downloads_total', result='too_large')
+                    return False
+                received = 0
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        print(f"Download aborted for {os.path.basename(file_path)}: over the {max_bytes} byte limit")
+                        metrics.inc('magazine_downloads_total', result='too_large')
+                        return False
+                    f.write(chunk)
+                    metrics.inc('magazine_bytes_downloaded_total', len(chunk))
+        os.replace(temp_path, file_path)
+        metrics.inc('magazine_downloads_total', result='ok')
+        return True
+    except Exception as e:
+        print(f"Download failed for {os.path.basename(file_path)}: {str(e)}")
+        metrics.inc('magazine_downloads_total', result='failed')
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def download_many(jobs: List[Tuple[str, str]], concurrency: Optional[int] = None) -> Dict[str, bool]:
+    """
+    Download (url, file_path) jobs with at most `concurrency` in flight,
+    sharing one connection pool. Returns {file_path: success} in job order.
+    """
+    concurrency = max(1, concurrency or DOWNLOAD_CONCURRENCY)
+    if not jobs:
+        return {}
+    with new_http_client(concurrency) as http:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as executor:
+            outcomes = list(executor.map(lambda job: download_file(http, *job), jobs))
+    return {file_path: ok for (_, file_path), ok in zip(jobs, outcomes)}
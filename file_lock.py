@@ -0,0 +1,83 @@
+"""
+Inter-process locks on INDEX_DIR.
+
+Several uvicorn workers (or a CLI run next to the server) share one index.
+Reads go straight to SQLite in WAL mode and never wait; anything that writes
+INDEX_DIR holds the 'writer' lock, so there is a single writer at a time.
+The 'sync' lock is held for as long as a process runs the background sync,
+so only one process polls the catalog and downloads.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from settings import INDEX_DIR
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) the lock only covers threads of this process
+    fcntl = None
+
+
+class FileLock:
+    """
+    Exclusive advisory lock (flock) on a file, shared by every process that uses
+    the same path. It is reentrant within the owning thread, and other threads
+    of the same process wait on it like other processes do.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; with blocking=False, return False instead of waiting for it"""
+        if not self._thread_lock.acquire(blocking=blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            f = open(self.path, 'a')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                f.close()
+                self._thread_lock.release()
+                return False
+            self._file = f
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    @contextmanager
+    def hold(self, blocking: bool = True) -> Iterator[bool]:
+        """Hold the lock for a block. Yields whether it was taken (always True when blocking)."""
+        acquired = self.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+
+_locks: Dict[str, FileLock] = {}
+_locks_lock = threading.Lock()
+
+
+def index_lock(name: str, index_dir: Optional[str] = None) -> FileLock:
+    """The process-wide lock INDEX_DIR/<name>.lock; every caller gets the same object"""
+    path = os.path.realpath(os.path.join(index_dir or INDEX_DIR, f'{name}.lock'))
+    with _locks_lock:
+        if path not in _locks:
+            _locks[path] = FileLock(path)
+        return _locks[path]
@@ -1,15 +1,30 @@
-from fastapi import FastAPI, HTTPException
-from typing import List, Dict, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import random
+import threading
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, db
-from appwrite.client import Client
-from appwrite.services.storage import Storage
-import requests
-import PyPDF2
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import json
+from catalog import CatalogCache, CatalogSnapshot
+from clients import APPWRITE_BUCKET, download_url
+from file_lock import index_lock
+from manifest import Manifest
+import metrics
+from pdf_cache import PdfCache
+from pdf_text import engine_name, engine_stats
+from pipeline import Progress, run_pipeline
+from query import QuerySyntaxError, fuzzy_query, is_advanced, parse_query
+from result_cache import CachedResponse, ResultCache
+from search_index import SearchIndex
+from settings import LOG_SAMPLE_RATE, MAGAZINES_DIR, SYNC_INTERVAL_SECONDS
+from snapshot import restore_snapshot
+from text_cache import file_sha256
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,179 +33,652 @@ load_dotenv()
 if not os.getenv('FIREBASE_ADMIN_CONFIG'):
     raise ValueError("FIREBASE_ADMIN_CONFIG environment variable is not set")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Not at import: these may wait on the index writer lock, and extraction workers
+    # spawned from `python index.py` re-import this module
+    await run_in_threadpool(open_index)
+    start_background_sync()
+    yield
+    stop_background_sync()
+
+async def ensure_index_open():
+    """Open the index on first use: serverless runtimes (e.g. @vercel/python) may not send lifespan events"""
+    if not _index_opened:
+        await run_in_threadpool(open_index)
+
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(ensure_index_open)])
+
+# Firebase is initialized on first use (see clients.py), not at import, to keep
+# serverless cold starts short; Appwrite is only reached through download URLs.
+
+# On-disk inverted index over the extracted PDF text (opened by open_index)
+search_index = SearchIndex(init_schema=False)
+
+# Cached Firebase catalog; searches read snapshots instead of syncing
+catalog = CatalogCache()
+
+# Which catalog issue and Appwrite file each local PDF came from
+manifest = Manifest(init_schema=False)
+
+# Keeps the downloaded PDFs within PDF_CACHE_MAX_BYTES, evicting those in least demand;
+# evicted issues stay searchable
+pdf_cache = PdfCache(manifest)
+
+# Serialized /search responses, invalidated by corpus and catalog versions
+result_cache = ResultCache()
+
+# Background refresher state
+_sync_stop = threading.Event()
+_sync_thread: Optional[threading.Thread] = None
+
+# Syncs run one at a time off the event loop; concurrent callers share the in-flight one
+_sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="magazine-sync")
+_sync_lock = threading.Lock()
+_sync_inflight: Optional[Future] = None
+
+# Set once open_index has run in this process
+_index_opened = False
+_index_open_lock = threading.Lock()
+
+# Stage progress of the running (or last) sync in this process
+_sync_progress: Optional[Progress] = None
 
-# Parse the JSON string from environment variable
-firebase_config = json.loads(os.getenv('FIREBASE_ADMIN_CONFIG'))
+# MAGAZINES_DIR mtime when searches last refreshed the index; adding, replacing or
+# removing a PDF changes it, so unchanged directories are not listed again
+_refreshed_mtime: Optional[int] = None
 
-# Initialize Firebase if not already initialized
-if not len(firebase_admin._apps):
-    cred = credentials.Certificate(firebase_config)
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': 'https://magazine-nexus-default-rtdb.asia-southeast1.firebasedatabase.app'
-    })
+# Page size bounds for /search
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
 
-# Initialize Appwrite
-client = Client()
-client.set_endpoint('https://cloud.appwrite.io/v1')
-client.set_project('676fc20b003ccf154826')
-client.set_key('standard_9dda74e82e65484c8a2a3140109bdfca83795e99028d68491edf78d6b19a10e008e35df1926856d3419bdda3c6fd56379805d352656cc3595a9e02219c991d00efdcb5dc5b9ca68f2093e3cc5e3474140df7eaa3a86a6b77acb6a510ad2d4972f8a266b7e1faa9beca33500fdf2367ce3db72463f795aa9ba9164a6737cd5f8f')
-storage = Storage(client)
+# Most keywords accepted by one /search/batch request
+MAX_BATCH_KEYWORDS = 50
 
 class SearchResult(BaseModel):
     magazine_id: str
     magazine_title: str
+    title: str
     file_id: str
     page_number: int
     line_number: int
     context: str
+    content_preview: str
+    # Relevance relative to the best hit; not set on streamed (unranked) results
+    confidence: Optional[float] = None
     issue_id: str
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     total_matches: int
+    total_results: int
+    limit: int
+    offset: int
+    # "Did you mean" rewrites, only filled when nothing matched
+    suggestions: List[str] = []
 
-def download_magazine(bucket_id: str, file_id: str, filename: str) -> bool:
-    """Download a single magazine if it doesn't exist locally"""
-    magazines_dir = "magazines"
-    if not os.path.exists(magazines_dir):
-        os.makedirs(magazines_dir)
-    
-    file_path = os.path.join(magazines_dir, filename)
-    if os.path.exists(file_path):
-        return False  # Magazine already exists
-    
-    download_url = f"{client._endpoint}/storage/buckets/{bucket_id}/files/{file_id}/download?project={client.get_project()}"
-    
-    response = requests.get(download_url)
-    if response.status_code == 200:
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        return True  # Successfully downloaded
-    return False
-
-def sync_magazines() -> Dict[str, int]:
-    """Sync magazines from Firebase/Appwrite and return stats"""
-    stats = {"new_downloads": 0, "total_magazines": 0}
+class BatchSearchRequest(BaseModel):
+    keywords: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_KEYWORDS)
+    limit: int = Field(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)
+    offset: int = Field(0, ge=0)
+    fuzzy: bool = False
+
+class KeywordSearchResponse(SearchResponse):
+    keyword: str
+
+class BatchSearchResponse(BaseModel):
+    # One response per requested keyword, in request order
+    results: List[KeywordSearchResponse]
+
+def open_index():
+    """
+    Seed a cold instance from the prebuilt snapshot, then create or upgrade the databases.
+    Runs once per process, from the lifespan or the first request; later calls return at once.
+    """
+    global _index_opened
+    if _index_opened:
+        return
+    with _index_open_lock:
+        if not _index_opened:
+            restore_snapshot()
+            manifest.init_schema()
+            search_index.init_schema()
+            _index_opened = True
+
+def magazine_download_url(bucket_id: str, file_id: str) -> str:
+    """Build the Appwrite download URL for a magazine PDF"""
+    return download_url(file_id, bucket_id)
+
+@search_index.writer.hold()
+@metrics.span('sync')
+def sync_magazines() -> Dict:
+    """
+    Sync magazines from Firebase/Appwrite and return stats plus the changeset.
+    The catalog is diffed against the local manifest: new issues and issues whose
+    PDF changed are downloaded, issues gone from the catalog are deleted, and only
+    those files are touched in the search index. Local PDFs the index lacks or holds
+    an older copy of (e.g. after a schema rebuild) are indexed again without a
+    download, and files that failed are retried on the next sync. Indexed PDFs are
+    evicted to stay within PDF_CACHE_MAX_BYTES. Runs under the index writer lock, so
+    a sync started by another worker finishes first.
+    """
+    stats = {"new_downloads": 0, "total_magazines": 0, "stages": {}}
+    changes = {
+        "added": [], "updated": [], "fetched": [], "reindexed": [], "removed": [], "evicted": [], "failed": [],
+        "unchanged": 0
+    }
+    stats["changes"] = changes
     
     try:
-        magazines_ref = db.reference('magazines')
-        magazine_issues_ref = db.reference('magazine_issues')
-        
-        magazines_data = magazines_ref.get()
-        magazine_issues_data = magazine_issues_ref.get()
+        # Sync always revalidates; unchanged trees are not downloaded again
+        magazine_issues_data = catalog.refresh().magazine_issues
         
+        # An empty catalog is more likely a bad read than every issue being retired
         if not magazine_issues_data:
             return stats
         
         stats["total_magazines"] = len(magazine_issues_data)
         
+        # filename -> (issue_id, file_id) for every issue that has a PDF
+        wanted = {}
         for issue_id, issue_data in magazine_issues_data.items():
             if 'pdfFileId' in issue_data and issue_data['pdfFileId']:
                 filename = f"{issue_data['magazineId']}_{issue_data['issueNumber']}.pdf"
-                if download_magazine(
-                    bucket_id='67718396003a69711df7',
-                    file_id=issue_data['pdfFileId'],
-                    filename=filename
-                ):
-                    stats["new_downloads"] += 1
-                    
+                wanted[filename] = (issue_id, issue_data['pdfFileId'])
+        
+        tracked = manifest.entries()
+        indexed = search_index.indexed_files()
+        jobs = []
+        job_details = {}
+        for filename, (issue_id, file_id) in wanted.items():
+            file_path = os.path.join(MAGAZINES_DIR, filename)
+            entry = tracked.get(filename)
+            on_disk = os.path.exists(file_path)
+            if on_disk and (entry is None or (entry.file_id == file_id and entry.size == os.path.getsize(file_path))):
+                if entry is None:
+                    # Downloaded before the manifest existed: adopt it instead of fetching again
+                    manifest.record(filename, issue_id, file_id, os.path.getsize(file_path), file_sha256(file_path))
+                stat = os.stat(file_path)
+                if indexed.get(filename) == (stat.st_size, stat.st_mtime):
+                    changes["unchanged"] += 1
+                else:
+                    # The PDF is current but the index lacks it: extract and index it, no download
+                    jobs.append((None, file_path))
+                    job_details[file_path] = (filename, issue_id, file_id, "reindexed")
+                continue
+            if entry is not None and not on_disk and entry.file_id == file_id and filename in indexed:
+                # Evicted or restored from a snapshot: searches are served from the index without the PDF
+                changes["unchanged"] += 1
+                continue
+            if entry is None:
+                kind = "added"
+            elif not on_disk and entry.file_id == file_id:
+                # Evicted, and its text must be rebuilt (e.g. the index was reset): fetch it again
+                kind = "fetched"
+            else:
+                kind = "updated"
+            jobs.append((magazine_download_url(APPWRITE_BUCKET, file_id), file_path))
+            job_details[file_path] = (filename, issue_id, file_id, kind)
+        
+        # Issues that left the catalog are pruned from disk, the index and the manifest
+        for filename in set(tracked) - set(wanted):
+            file_path = os.path.join(MAGAZINES_DIR, filename)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            search_index.remove_file(filename)
+            manifest.remove(filename)
+            changes["removed"].append(filename)
+        
+        def record_download(file_path: str):
+            filename, issue_id, file_id, _ = job_details[file_path]
+            manifest.record(filename, issue_id, file_id, os.path.getsize(file_path), file_sha256(file_path))
+        
+        def index_file(file_path: str) -> bool:
+            ok = search_index.index_file(file_path)
+            # Indexed PDFs are only needed for re-extraction; make room for the next download
+            changes["evicted"].extend(pdf_cache.evict(search_index.indexed_files()))
+            return ok
+        
+        # Room for the first downloads, e.g. after PDF_CACHE_MAX_BYTES was lowered
+        changes["evicted"].extend(pdf_cache.evict(indexed))
+        
+        # Each issue is extracted and indexed as soon as it is downloaded, so it is
+        # searchable without waiting for the rest of the batch
+        global _sync_progress
+        _sync_progress = Progress(len(jobs))
+        outcomes = run_pipeline(jobs, index_file, record_download, _sync_progress)
+        for file_path, outcome in outcomes.items():
+            filename, _, _, kind = job_details[file_path]
+            # Failed files are left out of the index (or stale in it), so the next sync retries them
+            changes[kind if outcome == 'indexed' else "failed"].append(filename)
+        stats["new_downloads"] = len(changes["added"]) + len(changes["updated"]) + len(changes["fetched"])
+        stats["stages"] = _sync_progress.snapshot()["stages"]
+        
+        manifest.touch([filename for filename in wanted if filename not in changes["failed"]])
+
+        # Rebuild the memory-mapped corpus here rather than on the first substring scan
+        if stats["new_downloads"] or changes["reindexed"] or changes["removed"]:
+            with metrics.span('corpus'):
+                search_index.corpus()
+
+        metrics.inc('magazine_syncs_total', result='ok')
         return stats
     except Exception as e:
+        metrics.inc('magazine_syncs_total', result='failed')
         raise HTTPException(status_code=500, detail=str(e))
 
-def search_pdfs(keyword: str) -> List[SearchResult]:
-    """Search for keyword in PDFs and return results"""
-    results = []
-    magazines_dir = "magazines"
-    keyword = keyword.lower().strip()
-    
-    # Get Firebase data for magazine details
-    magazines_data = db.reference('magazines').get()
-    magazine_issues_data = db.reference('magazine_issues').get()
-    
-    if not os.path.exists(magazines_dir):
-        return results
-    
-    magazine_titles = {id: data['title'] for id, data in magazines_data.items()}
-    
-    # Create a mapping of magazine_id_issue_number to issue data
-    issue_mapping = {
-        f"{issue['magazineId']}_{issue['issueNumber']}": {
-            'issue_id': issue_id,
-            'file_id': issue['pdfFileId']
-        }
-        for issue_id, issue in magazine_issues_data.items()
-        if 'pdfFileId' in issue
+def sync_magazines_coalesced() -> Future:
+    """Start a sync in the sync thread, or join the one already in flight"""
+    global _sync_inflight
+    with _sync_lock:
+        if _sync_inflight is None or _sync_inflight.done():
+            _sync_inflight = _sync_executor.submit(sync_magazines)
+        return _sync_inflight
+
+def _background_sync_loop():
+    """
+    Run sync_magazines every SYNC_INTERVAL_SECONDS until stopped, in one process only:
+    the first worker to take the sync lock keeps it, and the others retry each interval
+    in case it exits.
+    """
+    leader = index_lock('sync')
+    leading = False
+    try:
+        while not _sync_stop.is_set():
+            # Every worker records demand; the leader's sync evicts by it
+            try:
+                pdf_cache.flush()
+            except Exception as e:
+                print(f"Recording PDF demand failed: {str(e)}")
+            leading = leading or leader.acquire(blocking=False)
+            if leading:
+                try:
+                    sync_magazines_coalesced().result()
+                except Exception as e:
+                    print(f"Background sync failed: {str(e)}")
+            _sync_stop.wait(SYNC_INTERVAL_SECONDS)
+    finally:
+        if leading:
+            leader.release()
+
+def start_background_sync():
+    """Start the background refresher unless it is disabled or already running"""
+    global _sync_thread
+    if SYNC_INTERVAL_SECONDS <= 0 or (_sync_thread and _sync_thread.is_alive()):
+        return
+    _sync_stop.clear()
+    _sync_thread = threading.Thread(target=_background_sync_loop, name="magazine-sync", daemon=True)
+    _sync_thread.start()
+
+def stop_background_sync():
+    """Signal the background refresher to exit"""
+    _sync_stop.set()
+
+def _to_search_result(hit, snapshot: CatalogSnapshot, content_preview=None, confidence=None) -> SearchResult:
+    """
+    Join an index hit with its catalog details.
+    The fields come from the index and the catalog and are already typed, so the
+    model is constructed without running Pydantic validation per row.
+    """
+    magazine_id, issue_number, page_number, line_number, context = hit
+    # Get the issue data from the precomputed lookup
+    issue_data = snapshot.issue(magazine_id, issue_number) or {
+        'issue_id': 'unknown',
+        'file_id': 'unknown'
     }
+    magazine_title = snapshot.titles.get(magazine_id, "Unknown Magazine")
+    return SearchResult.model_construct(
+        magazine_id=magazine_id,
+        magazine_title=magazine_title,
+        title=magazine_title,
+        file_id=issue_data['file_id'],
+        page_number=page_number,
+        line_number=line_number,
+        context=context,
+        content_preview=context if content_preview is None else content_preview,
+        confidence=confidence,
+        issue_id=issue_data['issue_id']
+    )
+
+def iter_search_pdfs(keyword: str) -> Iterator[SearchResult]:
+    """Yield results in file/page/line order as each document is searched"""
+    snapshot = catalog.get()
+    for hit in search_index.iter_search(keyword, MAGAZINES_DIR):
+        result = _to_search_result(hit, snapshot)
+        pdf_cache.record_demand([result.issue_id])
+        yield result
+
+def search_pdfs(keyword: str, limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0) -> Tuple[int, List[SearchResult]]:
+    """Search for keyword in the indexed PDFs and return (total matches, ranked page of results)"""
+    # Magazine details come from the cached catalog snapshot, not a fresh fetch
+    snapshot = catalog.get()
     
-    for filename in os.listdir(magazines_dir):
-        if not filename.endswith('.pdf'):
-            continue
-            
-        magazine_id = filename.split('_')[0]
-        issue_number = filename.split('_')[1].replace('.pdf', '')
-        magazine_title = magazine_titles.get(magazine_id, "Unknown Magazine")
-        
-        # Get the issue data from our mapping
-        issue_data = issue_mapping.get(f"{magazine_id}_{issue_number}", {
-            'issue_id': 'unknown',
-            'file_id': 'unknown'
-        })
-        
-        try:
-            with open(os.path.join(magazines_dir, filename), 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    text = pdf_reader.pages[page_num].extract_text()
-                    text_lines = [line.strip() for line in text.split('\n') if line.strip()]
-                    
-                    for line_num, line in enumerate(text_lines):
-                        if keyword in line.lower():
-                            results.append(SearchResult(
-                                magazine_id=magazine_id,
-                                magazine_title=magazine_title,
-                                file_id=issue_data['file_id'],
-                                page_number=page_num + 1,
-                                line_number=line_num + 1,
-                                context=line.strip(),
-                                issue_id=issue_data['issue_id']
-                            ))
-        except Exception as e:
-            print(f"Error processing {filename}: {str(e)}")
-    
-    return results
+    # Only the requested page of hits is turned into SearchResult objects.
+    # Confidence is relative to the best hit overall, so it is stable across pages.
+    with metrics.span('match'):
+        total, best_score, ranked = search_index.search_ranked(keyword, limit, offset)
+    return total, _to_search_results(ranked, best_score, snapshot)
+
+def _to_search_results(ranked, best_score: float, snapshot: CatalogSnapshot) -> List[SearchResult]:
+    """Turn one page of ranked hits into SearchResults"""
+    with metrics.span('serialize'):
+        return [
+            _to_search_result(
+                hit, snapshot,
+                content_preview=preview,
+                confidence=round(score / best_score, 4) if best_score > 0 else 0.0
+            )
+            for score, hit, preview in ranked
+        ]
 
 @app.get("/sync")
 async def sync_endpoint():
     """Endpoint to sync magazines"""
-    stats = sync_magazines()
+    # Identical concurrent requests await the same sync instead of starting their own
+    stats = await asyncio.wrap_future(sync_magazines_coalesced())
     return {
         "status": "success",
         "new_downloads": stats["new_downloads"],
-        "total_magazines": stats["total_magazines"]
+        "total_magazines": stats["total_magazines"],
+        "changes": stats["changes"],
+        "stages": stats["stages"]
     }
 
-@app.get("/search/{keyword}", response_model=SearchResponse)
-async def search_endpoint(keyword: str):
-    """Endpoint to search magazines"""
-    # First sync to get any new magazines
-    sync_magazines()
+@app.get("/sync/progress")
+async def sync_progress_endpoint():
+    """Per-stage progress (waiting/active/done/failed) of the running sync, or of the last one"""
+    if _sync_progress is None:
+        return {"running": False, "total": 0, "stages": {}}
+    return _sync_progress.snapshot()
+
+def validate_query(keyword: str):
+    """Reject malformed query-language searches with a 400"""
+    if is_advanced(keyword):
+        try:
+            parse_query(keyword)
+        except QuerySyntaxError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def build_search_response(keyword: str, limit: int, offset: int, fuzzy: bool = False) -> SearchResponse:
+    """Run a search and wrap it in a SearchResponse (blocking)"""
+    try:
+        total, results = search_pdfs(search_query(keyword, fuzzy), limit, offset)
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Then perform the search
-    results = search_pdfs(keyword)
+    suggestions = []
+    if total == 0:
+        with metrics.span('suggest'):
+            suggestions = search_index.suggest(keyword)
     
-    # Ensure the response matches our model
-    response = SearchResponse(
+    # Built from already-validated parts; serialization does not need another pass
+    response = SearchResponse.model_construct(
         results=results,
-        total_matches=len(results)
+        total_matches=total,
+        total_results=total,
+        limit=limit,
+        offset=offset,
+        suggestions=suggestions
     )
-    
-    print("Response data:", response.dict())  # Debug print
     return response
 
+def build_batch_response(keywords: List[str], limit: int, offset: int, fuzzy: bool = False) -> BatchSearchResponse:
+    """Run several searches in one pass over the index and group the responses per keyword (blocking)"""
+    snapshot = catalog.get()
+    try:
+        with metrics.span('match'):
+            ranked_lists = search_index.search_ranked_many(
+                [search_query(keyword, fuzzy) for keyword in keywords], limit, offset
+            )
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    responses = []
+    for keyword, (total, best_score, ranked) in zip(keywords, ranked_lists):
+        suggestions = []
+        if total == 0:
+            with metrics.span('suggest'):
+                suggestions = search_index.suggest(keyword)
+        responses.append(KeywordSearchResponse.model_construct(
+            keyword=keyword,
+            results=_to_search_results(ranked, best_score, snapshot),
+            total_matches=total,
+            total_results=total,
+            limit=limit,
+            offset=offset,
+                suggestions=suggestions
+        ))
+    return BatchSearchResponse.model_construct(results=responses)
+
+def search_query(keyword: str, fuzzy: bool = False) -> str:
+    """The query actually run for a keyword: fuzzy=true makes each word of a plain keyword typo-tolerant"""
+    if fuzzy and not is_advanced(keyword):
+        return fuzzy_query(keyword) or keyword
+    return keyword
+
+def normalize_keyword(keyword: str) -> str:
+    """Cache key form of a query: plain keywords are case-insensitive, operators are not"""
+    if is_advanced(keyword):
+        return ' '.join(keyword.split())
+    return keyword.lower().strip()
+
+def cached_search_response(keyword: str, limit: int, offset: int, fuzzy: bool = False) -> Tuple[bytes, float]:
+    """
+    Return a serialized SearchResponse, from the result cache when the corpus is
+    unchanged, and the age of the catalog it was served with (blocking)
+    """
+    key = (normalize_keyword(keyword), limit, offset, fuzzy)
+    return cached_response(key, lambda: build_search_response(keyword, limit, offset, fuzzy), keyword)
+
+def cached_batch_response(keywords: List[str], limit: int, offset: int, fuzzy: bool = False) -> Tuple[bytes, float]:
+    """Return a serialized BatchSearchResponse like cached_search_response (blocking)"""
+    # Raw keywords: each response echoes its keyword as it was sent
+    key = ('batch', tuple(keywords), limit, offset, fuzzy)
+    return cached_response(key, lambda: build_batch_response(keywords, limit, offset, fuzzy))
+
+def refresh_local_pdfs():
+    """
+    Index PDFs that reached MAGAZINES_DIR without going through sync (blocking).
+    Costs one stat while the directory is unchanged, and is skipped while another
+    worker is writing the index: searches read what is there and never wait.
+    """
+    global _refreshed_mtime
+    try:
+        mtime = os.stat(MAGAZINES_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return
+    if mtime == _refreshed_mtime:
+        return
+    with metrics.span('refresh'), search_index.writer.hold(blocking=False) as writing:
+        if writing:
+            search_index.refresh(MAGAZINES_DIR, keep=manifest.entries())
+            _refreshed_mtime = mtime
+
+def served_issue_ids(response: BaseModel) -> Tuple[str, ...]:
+    """The distinct issues a search or batch response returns results from"""
+    responses = response.results if isinstance(response, BatchSearchResponse) else [response]
+    return tuple(dict.fromkeys(result.issue_id for each in responses for result in each.results))
+
+def cached_response(key: tuple, build: Callable[[], BaseModel], keyword: Optional[str] = None) -> Tuple[bytes, float]:
+    """
+    Return build()'s response serialized, or the cached bytes for key if the corpus and
+    catalog are unchanged, with the age of the catalog in seconds. Suggestions keep the
+    case of the keyword they were made for, so a response with suggestions is only
+    served again for that exact keyword.
+    """
+    snapshot = catalog.get()
+    version = (search_index.corpus_version(), snapshot.version)
+    cached = result_cache.get(key, version, keyword)
+    metrics.inc('magazine_result_cache_total', result='miss' if cached is None else 'hit')
+    metrics.annotate(cached=cached is not None)
+    if cached is None:
+        # Indexing belongs to sync; misses also pick up PDFs dropped into the directory
+        # by hand, which cached responses only reflect once they expire
+        refresh_local_pdfs()
+        version = (search_index.corpus_version(), snapshot.version)
+        response = build()
+        with metrics.span('serialize'):
+            cached = CachedResponse(
+                response.model_dump_json().encode(),
+                served_issue_ids(response),
+                keyword if getattr(response, 'suggestions', None) else None
+            )
+        result_cache.put(key, version, cached)
+    pdf_cache.record_demand(cached.issue_ids)
+    # The catalog age keeps moving, so it is sent as a header rather than cached in the body
+    return cached.payload, round(snapshot.age_seconds(), 3)
+
+def timed_search_response(
+    keyword: str, limit: int, offset: int, fuzzy: bool = False
+) -> Tuple[bytes, float, Dict[str, float]]:
+    """
+    Run cached_search_response and return it with its per-stage timings in milliseconds.
+    A LOG_SAMPLE_RATE fraction of requests is logged as one JSON line.
+    """
+    return timed_response(
+        'search', lambda: cached_search_response(keyword, limit, offset, fuzzy),
+        keyword=keyword, limit=limit, offset=offset, fuzzy=fuzzy
+    )
+
+def timed_batch_response(
+    keywords: List[str], limit: int, offset: int, fuzzy: bool = False
+) -> Tuple[bytes, float, Dict[str, float]]:
+    """Run cached_batch_response and return it with its per-stage timings in milliseconds"""
+    return timed_response(
+        'batch', lambda: cached_batch_response(keywords, limit, offset, fuzzy),
+        keywords=keywords, limit=limit, offset=offset, fuzzy=fuzzy
+    )
+
+def timed_response(
+    route: str, build: Callable[[], Tuple[bytes, float]], **fields
+) -> Tuple[bytes, float, Dict[str, float]]:
+    """Time build() per stage, count it under route and log a LOG_SAMPLE_RATE fraction of requests"""
+    with metrics.request_context(**fields) as request:
+        with metrics.span('search'):
+            payload, catalog_age = build()
+    metrics.inc('magazine_search_requests_total', route=route)
+    spans = {stage: round(ms, 3) for stage, ms in request['spans'].items()}
+    if random.random() < LOG_SAMPLE_RATE:
+        print(json.dumps({"event": route, **request, "spans": spans, "bytes": len(payload)}))
+    return payload, catalog_age, spans
+
+def timed_json_response(payload: bytes, catalog_age: float, spans: Dict[str, float]) -> Response:
+    """Wrap a serialized response with the catalog age and its stage timings (as Server-Timing) in headers"""
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={
+            "X-Catalog-Age": str(catalog_age),
+            "Server-Timing": ", ".join(f"{stage};dur={ms}" for stage, ms in spans.items())
+        }
+    )
+
+@app.get("/search/{keyword}", response_model=SearchResponse)
+@app.get("/api/search/{keyword}", response_model=SearchResponse)
+async def search_endpoint(
+    keyword: str,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0),
+    fuzzy: bool = False
+):
+    """
+    Endpoint to search magazines, ranked by relevance and paginated with limit/offset.
+    Plain keywords match as case-insensitive substrings. The query language adds
+    AND/OR/NOT (or -word), "exact phrases", prefix* wildcards, word~ typo tolerance,
+    (grouping) and magazine:ID / issue:N filters. fuzzy=true makes every word of a
+    plain keyword typo-tolerant; searches with no hits return "did you mean" suggestions.
+    """
+    # Syncing happens in the background or through /sync, never on the search path.
+    # Index reads and catalog fetches block, so they run in the threadpool.
+    payload, catalog_age, spans = await run_in_threadpool(timed_search_response, keyword, limit, offset, fuzzy)
+    # Cached responses are already serialized, so they skip model validation and encoding
+    return timed_json_response(payload, catalog_age, spans)
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+@app.post("/api/search/batch", response_model=BatchSearchResponse)
+async def search_batch_endpoint(request: BatchSearchRequest):
+    """
+    Search up to MAX_BATCH_KEYWORDS keywords at once, e.g. for a dashboard page.
+    Each keyword gets its own ranked, paginated response (as from /search), grouped
+    in request order; plain keywords are all matched in a single pass over the index.
+    """
+    for keyword in request.keywords:
+        if not keyword.strip():
+            raise HTTPException(status_code=400, detail="Keywords must not be empty")
+        validate_query(keyword)
+    payload, catalog_age, spans = await run_in_threadpool(
+        timed_batch_response, request.keywords, request.limit, request.offset, request.fuzzy
+    )
+    return timed_json_response(payload, catalog_age, spans)
+
+async def _stream_search(request: Request, keyword: str, limit: Optional[int], sse: bool):
+    """Relay results from the search pipeline until the limit is hit or the client leaves"""
+    results = iter_search_pdfs(keyword)
+    sent = 0
+    try:
+        while limit is None or sent < limit:
+            # Each step may parse a PDF or hit SQLite, so it runs in the threadpool
+            result = await run_in_threadpool(next, results, None)
+            if result is None or await request.is_disconnected():
+                break
+            payload = result.model_dump_json()
+            yield f"data: {payload}\n\n" if sse else f"{payload}\n"
+            sent += 1
+        if sse:
+            yield f"event: end\ndata: {json.dumps({'sent': sent})}\n\n"
+    finally:
+        try:
+            results.close()
+        except ValueError:
+            # Cancelled mid-step: the threadpool still owns the generator and it is dropped afterwards
+            pass
+
+@app.get("/search/{keyword}/stream")
+async def search_stream_endpoint(
+    request: Request,
+    keyword: str,
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$")
+):
+    """Stream results as NDJSON (default) or server-sent events as soon as they are found"""
+    validate_query(keyword)
+    metrics.inc('magazine_search_requests_total', route='stream')
+    sse = format == "sse"
+    return StreamingResponse(
+        _stream_search(request, keyword, limit, sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson"
+    )
+
+@app.post("/catalog/invalidate")
+async def catalog_invalidate_endpoint():
+    """Make the next catalog read revalidate against Firebase"""
+    catalog.invalidate()
+    return {"status": "success"}
+
+@app.get("/cache/stats")
+async def cache_stats_endpoint():
+    """Report result cache size and hit/miss counters"""
+    return result_cache.stats()
+
+@app.get("/cache/pdfs")
+async def pdf_cache_stats_endpoint():
+    """Report how much of the PDF disk budget is in use"""
+    return await run_in_threadpool(pdf_cache.stats)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage timings and counters in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/engines")
+async def engines_endpoint():
+    """Report the configured PDF engine and per-engine extraction throughput"""
+    return {
+        "engine": engine_name(),
+        "stats": engine_stats()
+    }
+
 # For local development
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from settings import INDEX_DIR
+
+# Bump whenever the layout changes; older manifests are discarded
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    filename TEXT PRIMARY KEY,
+    issue_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    filename TEXT PRIMARY KEY,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL
+);
+"""
+
+
+class ManifestEntry(NamedTuple):
+    filename: str
+    issue_id: str
+    file_id: str
+    size: int
+    sha256: str
+    last_seen: float
+
+
+class Manifest:
+    """
+    Record of every magazine PDF that sync has placed in the magazines directory:
+    which catalog issue and Appwrite file it came from, its size and checksum, and
+    when the catalog last listed it. Sync diffs the catalog against this instead of
+    checking for files on disk.
+    """
+
+    def __init__(self, path: Optional[str] = None, init_schema: bool = True):
+        self.path = path or os.path.join(INDEX_DIR, 'manifest.sqlite')
+        if init_schema:
+            self.init_schema()
+
+    def init_schema(self):
+        """Create the tables, discarding a manifest with an older layout"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                for table in ('usage', 'issues'):
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def entries(self) -> Dict[str, ManifestEntry]:
+        """Return {filename: entry} for every tracked PDF"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT filename, issue_id, file_id, size, sha256, last_seen FROM issues'
+            ).fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def record(self, filename: str, issue_id: str, file_id: str, size: int, sha256: str):
+        """Add or replace the entry for a PDF that is now on disk"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO issues (filename, issue_id, file_id, size, sha256, last_seen) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (filename, issue_id, file_id, size, sha256, time.time())
+            )
+
+    def touch(self, filenames):
+        """Mark PDFs as listed by the current catalog"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany('UPDATE issues SET last_seen = ? WHERE filename = ?', [(now, name) for name in filenames])
+
+    def remove(self, filename: str):
+        """Stop tracking a PDF"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM issues WHERE filename = ?', (filename,))
+            conn.execute('DELETE FROM usage WHERE filename = ?', (filename,))
+
+    def mark_used(self, uses: Dict[str, Tuple[float, int]]):
+        """Add demand for PDFs, given as {filename: (last_used, times served)}, for cache eviction"""
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO usage (filename, last_used, uses) VALUES (?, ?, ?) '
+                'ON CONFLICT (filename) DO UPDATE SET '
+                'last_used = MAX(last_used, excluded.last_used), uses = uses + excluded.uses',
+                [(filename, last_used, count) for filename, (last_used, count) in uses.items()]
+            )
+
+    def usage(self) -> Dict[str, Tuple[float, int]]:
+        """Return {filename: (last_used, uses)} for every PDF used since it was tracked"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT filename, last_used, uses FROM usage').fetchall()
+        return {filename: (last_used, uses) for filename, last_used, uses in rows}
@@ -0,0 +1,132 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# name -> (type, help); every metric is declared here so /metrics can describe it
+METRICS = {
+    'magazine_stage_seconds': ('histogram', "Time spent per pipeline stage"),
+    'magazine_pages_extracted_total': ('counter', "PDF pages extracted, per engine"),
+    'magazine_bytes_downloaded_total': ('counter', "Bytes of magazine PDFs downloaded"),
+    'magazine_downloads_total': ('counter', "Magazine downloads by result"),
+    'magazine_files_indexed_total': ('counter', "PDFs added to the search index by result"),
+    'magazine_result_cache_total': ('counter', "Search result cache lookups by result"),
+    'magazine_search_requests_total': ('counter', "Search requests served"),
+    'magazine_syncs_total': ('counter', "Magazine syncs by result"),
+    'magazine_pdf_evictions_total': ('counter', "Local PDFs evicted to stay within the disk budget"),
+    'magazine_pdf_evicted_bytes_total': ('counter', "Bytes of local PDFs evicted to stay within the disk budget"),
+}
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+_histograms: Dict[Tuple[str, Labels], list] = {}
+
+# Fields and span timings of the request being handled in this context, if any
+_request: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add to a counter"""
+    with _lock:
+        _counters[(name, _labels(labels))] += value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record one observation in a histogram"""
+    key = (name, _labels(labels))
+    with _lock:
+        # Per-bucket counts, then sum and count
+        histogram = _histograms.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as a pipeline stage, and add it to the current request's spans"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+def record_span(stage: str, seconds: float):
+    """Record a stage timed elsewhere (e.g. in a worker process)"""
+    observe('magazine_stage_seconds', seconds, stage=stage)
+    request = _request.get()
+    if request is not None:
+        spans = request['spans']
+        spans[stage] = spans.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def request_context(**fields) -> Iterator[Dict]:
+    """
+    Collect span timings (milliseconds) and annotations for one request.
+    Yields {'spans': {stage: ms}, **fields}; nested spans and annotate() fill it in.
+    """
+    request = {'spans': {}, **fields}
+    token = _request.set(request)
+    try:
+        yield request
+    finally:
+        _request.reset(token)
+
+
+def annotate(**fields):
+    """Attach fields to the current request, if one is being collected"""
+    request = _request.get()
+    if request is not None:
+        request.update(fields)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {int(value) if value.is_integer() else value}")
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(BUCKETS, histogram):
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+    return '\n'.join(lines) + '\n'
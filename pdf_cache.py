@@ -0,0 +1,140 @@
+"""
+Disk budget for the downloaded PDFs in MAGAZINES_DIR.
+
+Once a PDF is indexed its text lives in the text cache and the search index, so
+the file itself is only needed again to re-extract it. The budget covers the PDFs
+plus the derived data in INDEX_DIR (search index and its WAL, text cache, manifest,
+corpus), since both share the disk. When they grow past PDF_CACHE_MAX_BYTES,
+indexed PDFs are deleted, those in least recent (or least frequent) demand first.
+Demand is the number of responses that returned results from an issue, whether
+from search, batch or stream. Their manifest entries stay, so the index keeps
+serving them and sync fetches a PDF from Appwrite again only if its text has to
+be rebuilt.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import metrics
+from manifest import Manifest
+from settings import INDEX_DIR, MAGAZINES_DIR, PDF_CACHE_MAX_BYTES, PDF_CACHE_POLICY
+
+
+class PdfCache:
+    """Evicts indexed PDFs from a directory to keep it and index_dir within max_bytes (0 = unbounded)"""
+
+    def __init__(
+        self,
+        manifest: Manifest,
+        directory: str = MAGAZINES_DIR,
+        max_bytes: int = PDF_CACHE_MAX_BYTES,
+        policy: str = PDF_CACHE_POLICY,
+        index_dir: str = INDEX_DIR
+    ):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown PDF cache policy: {policy}")
+        self.manifest = manifest
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.index_dir = index_dir
+        # {issue_id: (last_used, times served)} not yet written to the manifest
+        self._demand: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def _local_files(self) -> Dict[str, os.stat_result]:
+        """Return {filename: stat} for every PDF in the directory"""
+        files = {}
+        if os.path.exists(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.pdf'):
+                    try:
+                        files[filename] = os.stat(os.path.join(self.directory, filename))
+                    except FileNotFoundError:
+                        continue
+        return files
+
+    def _index_bytes(self) -> int:
+        """Total size of the files in index_dir"""
+        total = 0
+        if os.path.exists(self.index_dir):
+            for entry in os.scandir(self.index_dir):
+                try:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+                except FileNotFoundError:
+                    continue
+        return total
+
+    def record_demand(self, issue_ids: Iterable[str]):
+        """Count one response returning results from each issue; kept in memory until flush()"""
+        now = time.time()
+        with self._lock:
+            for issue_id in issue_ids:
+                self._demand[issue_id] = (now, self._demand.get(issue_id, (0.0, 0))[1] + 1)
+
+    def flush(self):
+        """Write the demand recorded since the last flush to the manifest"""
+        with self._lock:
+            demand, self._demand = self._demand, {}
+        if not demand:
+            return
+        filenames = {entry.issue_id: filename for filename, entry in self.manifest.entries().items()}
+        self.manifest.mark_used({
+            filenames[issue_id]: uses for issue_id, uses in demand.items() if issue_id in filenames
+        })
+
+    def evict(self, indexed: Dict[str, Tuple[int, float]]) -> List[str]:
+        """
+        Delete PDFs until the directory and index_dir fit the budget and return their
+        filenames. Only files tracked by the manifest and indexed as they are on disk
+        (`indexed` is {filename: (size, mtime)}) are candidates, so nothing is
+        lost that cannot be served from the index or fetched again.
+        """
+        if self.max_bytes <= 0:
+            return []
+        files = self._local_files()
+        total = sum(stat.st_size for stat in files.values()) + self._index_bytes()
+        if total <= self.max_bytes:
+            return []
+
+        self.flush()
+        tracked = self.manifest.entries()
+        usage = self.manifest.usage()
+        candidates = [
+            filename for filename, stat in files.items()
+            if filename in tracked and indexed.get(filename) == (stat.st_size, stat.st_mtime)
+        ]
+
+        def order(filename: str) -> Tuple:
+            last_used, uses = usage.get(filename, (0.0, 0))
+            return (last_used, uses, filename) if self.policy == 'lru' else (uses, last_used, filename)
+
+        evicted = []
+        for filename in sorted(candidates, key=order):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+            total -= files[filename].st_size
+            evicted.append(filename)
+            metrics.inc('magazine_pdf_evictions_total')
+            metrics.inc('magazine_pdf_evicted_bytes_total', files[filename].st_size)
+        if evicted:
+            print(f"Evicted {len(evicted)} PDFs; {total} of {self.max_bytes} bytes in use")
+        if total > self.max_bytes:
+            print(f"PDF cache over budget: {total} of {self.max_bytes} bytes in use with no PDF left to evict")
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number and total size of local PDFs, and the size of the index, against the budget"""
+        files = self._local_files()
+        return {
+            "files": len(files),
+            "bytes": sum(stat.st_size for stat in files.values()),
+            "index_bytes": self._index_bytes(),
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,298 @@
+import importlib.util
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from settings import EXTRACT_WORKERS, MAX_PDF_BYTES, MAX_PDF_PAGES, PDF_ENGINE
+
+# Large PDFs are split into page ranges of this size so one issue can use several workers
+PAGES_PER_TASK = 32
+
+# Engine used when the configured one is unavailable or cannot parse a file
+FALLBACK_ENGINE = 'pypdf2'
+
+class PdfEngine:
+    """Minimal interface every text extraction backend implements"""
+    name = ''
+    # Module the engine imports; checked without importing it to resolve engine names cheaply
+    module = ''
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError
+
+    def iter_range(self, file_path: str, start: int, stop: int) -> Iterator[str]:
+        """Yield the text of pages [start, stop) one at a time"""
+        raise NotImplementedError
+
+    def extract_range(self, file_path: str, start: int, stop: int) -> List[str]:
+        return list(self.iter_range(file_path, start, stop))
+
+class PyMuPDFEngine(PdfEngine):
+    """Extraction through PyMuPDF (MuPDF bindings); much faster than PyPDF2"""
+    name = 'pymupdf'
+    module = 'pymupdf'
+
+    def __init__(self):
+        import pymupdf
+        self._pymupdf = pymupdf
+
+    def page_count(self, file_path: str) -> int:
+        with self._pymupdf.open(file_path) as doc:
+            return doc.page_count
+
+    def iter_range(self, file_path: str, start: int, stop: int) -> Iterator[str]:
+        with self._pymupdf.open(file_path) as doc:
+            for page_num in range(start, min(stop, doc.page_count)):
+                page = doc.load_page(page_num)
+                text = page.get_text()
+                # Drop the parsed page before loading the next one
+                del page
+                yield text
+
+class PyPDF2Engine(PdfEngine):
+    """Pure-Python extraction through PyPDF2"""
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def __init__(self):
+        import PyPDF2
+        self._pypdf2 = PyPDF2
+
+    def page_count(self, file_path: str) -> int:
+        with open(file_path, 'rb') as file:
+            return len(self._pypdf2.PdfReader(file).pages)
+
+    def iter_range(self, file_path: str, start: int, stop: int) -> Iterator[str]:
+        # The reader keeps parsed pages alive until it is closed, which is why ranges are short
+        with open(file_path, 'rb') as file:
+            pdf_reader = self._pypdf2.PdfReader(file)
+            for page_num in range(start, min(stop, len(pdf_reader.pages))):
+                yield pdf_reader.pages[page_num].extract_text()
+
+ENGINES = {
+    PyMuPDFEngine.name: PyMuPDFEngine,
+    PyPDF2Engine.name: PyPDF2Engine,
+}
+
+_engines: Dict[str, PdfEngine] = {}
+
+def get_engine(name: Optional[str] = None) -> PdfEngine:
+    """Return the named engine (default: PDF_ENGINE), falling back to PyPDF2 if it can't load"""
+    name = name or PDF_ENGINE
+    if name not in _engines:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown PDF engine '{name}', expected one of {sorted(ENGINES)}")
+        try:
+            _engines[name] = ENGINES[name]()
+        except ImportError as e:
+            if name == FALLBACK_ENGINE:
+                raise
+            print(f"PDF engine '{name}' unavailable ({str(e)}), using {FALLBACK_ENGINE}")
+            _engines[name] = get_engine(FALLBACK_ENGINE)
+    return _engines[name]
+
+def engine_name() -> str:
+    """
+    Name of the engine that will actually be used for extraction.
+    Resolved without importing the engine, so callers such as the index schema
+    check don't pay for loading a PDF library until something is extracted.
+    """
+    name = PDF_ENGINE
+    if name in _engines:
+        return _engines[name].name
+    if name not in ENGINES:
+        # Let get_engine report the unknown name
+        return get_engine(name).name
+    if importlib.util.find_spec(ENGINES[name].module) is None:
+        return FALLBACK_ENGINE
+    return name
+
+# Pages extracted and seconds spent per engine in this process
+_stats_lock = threading.Lock()
+_engine_stats: Dict[str, Dict[str, float]] = {}
+
+def record_extraction(engine: str, pages: int, seconds: float):
+    """Add an extraction run to the per-engine throughput counters"""
+    with _stats_lock:
+        stats = _engine_stats.setdefault(engine, {"pages": 0, "seconds": 0.0})
+        stats["pages"] += pages
+        stats["seconds"] += seconds
+    metrics.inc('magazine_pages_extracted_total', pages, engine=engine)
+
+def engine_stats() -> Dict[str, Dict[str, float]]:
+    """Return {engine: {pages, seconds, pages_per_second}} for this process"""
+    with _stats_lock:
+        return {
+            name: {
+                "pages": stats["pages"],
+                "seconds": round(stats["seconds"], 3),
+                "pages_per_second": round(stats["pages"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+            }
+            for name, stats in _engine_stats.items()
+        }
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes, or 0 where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+def _run_range(engine: PdfEngine, file_path: str, start: int, stop: int) -> Tuple[str, List[str], float, int]:
+    baseline = peak = current_rss()
+    started = time.perf_counter()
+    texts = []
+    for text in engine.iter_range(file_path, start, stop):
+        texts.append(text)
+        peak = max(peak, current_rss())
+    return engine.name, texts, time.perf_counter() - started, peak - baseline
+
+def _extract_range(file_path: str, start: int, stop: int, name: Optional[str] = None) -> Tuple[str, List[str], float, int]:
+    """Extract pages [start, stop) and return (engine used, texts, seconds spent, peak RSS growth in bytes)"""
+    engine = get_engine(name)
+    try:
+        return _run_range(engine, file_path, start, stop)
+    except Exception:
+        if engine.name == FALLBACK_ENGINE:
+            raise
+        return _run_range(get_engine(FALLBACK_ENGINE), file_path, start, stop)
+
+def count_pages(file_path: str) -> int:
+    """Return the number of pages in a PDF without extracting any text"""
+    try:
+        return get_engine().page_count(file_path)
+    except Exception:
+        if get_engine().name == FALLBACK_ENGINE:
+            raise
+        return get_engine(FALLBACK_ENGINE).page_count(file_path)
+
+def pages_to_extract(file_path: str) -> int:
+    """
+    Number of pages to extract from a PDF. Files over MAX_PDF_BYTES are rejected
+    and pages past MAX_PDF_PAGES are skipped, so one huge issue can't exhaust memory.
+    """
+    size = os.path.getsize(file_path)
+    if size > MAX_PDF_BYTES:
+        raise ValueError(f"{os.path.basename(file_path)} is {size} bytes, over the {MAX_PDF_BYTES} byte limit")
+    page_count = count_pages(file_path)
+    if page_count > MAX_PDF_PAGES:
+        print(f"{os.path.basename(file_path)} has {page_count} pages; only the first {MAX_PDF_PAGES} are extracted")
+        return MAX_PDF_PAGES
+    return page_count
+
+def new_extract_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """A process pool for extraction, to share across several iter_extract calls"""
+    # Spawned workers avoid forking a process that may hold sync/SQLite threads
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers or EXTRACT_WORKERS, mp_context=context)
+
+def _run_tasks(
+    tasks: List[Tuple],
+    workers: int,
+    pool: Optional[Executor] = None
+) -> Iterator[Tuple[Tuple, object]]:
+    """
+    Yield (task, result or exception) in task order, with a bounded number of tasks in flight.
+    Tasks go to `pool` when given, otherwise to a pool created for this batch.
+    """
+    if pool is None and (workers <= 1 or len(tasks) <= 1):
+        for task in tasks:
+            try:
+                yield task, _extract_range(*task)
+            except Exception as e:
+                yield task, e
+        return
+
+    workers = min(workers, len(tasks))
+    with nullcontext(pool) if pool is not None else new_extract_pool(workers) as executor:
+        remaining = iter(tasks)
+        # A couple of tasks per worker keeps them busy without buffering the whole batch
+        pending = deque(
+            (task, executor.submit(_extract_range, *task))
+            for task in itertools.islice(remaining, workers * 2)
+        )
+        while pending:
+            task, future = pending.popleft()
+            next_task = next(remaining, None)
+            if next_task is not None:
+                pending.append((next_task, executor.submit(_extract_range, *next_task)))
+            try:
+                yield task, future.result()
+            except Exception as e:
+                yield task, e
+
+def iter_extract(
+    file_paths: List[str],
+    workers: Optional[int] = None,
+    pool: Optional[Executor] = None
+) -> Iterator[Tuple[str, str, object]]:
+    """
+    Extract several PDFs across a process pool, streaming the results in file/page order:
+      ('pages', file_path, texts)   up to PAGES_PER_TASK consecutive pages
+      ('done', file_path, stats)    the file is complete; stats has pages, seconds, peak_rss_bytes
+      ('failed', file_path, error)  the file could not be parsed; discard its earlier pages
+    Only a few page ranges are held at once, so memory does not grow with file or batch size.
+    Passing a pool from new_extract_pool reuses its processes instead of starting new ones.
+    """
+    workers = workers or EXTRACT_WORKERS
+    name = engine_name()
+    tasks = []
+    chunks_left: Dict[str, int] = {}
+    for file_path in file_paths:
+        try:
+            page_count = pages_to_extract(file_path)
+        except Exception as e:
+            print(f"Error processing {file_path}: {str(e)}")
+            yield 'failed', file_path, e
+            continue
+        starts = range(0, max(page_count, 1), PAGES_PER_TASK)
+        tasks.extend((file_path, start, min(start + PAGES_PER_TASK, max(page_count, 1)), name) for start in starts)
+        chunks_left[file_path] = len(starts)
+
+    stats: Dict[str, Dict] = {}
+    for (file_path, _, _, _), chunk in _run_tasks(tasks, workers, pool):
+        if file_path not in chunks_left:
+            continue
+        if isinstance(chunk, Exception):
+            print(f"Error processing {file_path}: {str(chunk)}")
+            del chunks_left[file_path]
+            stats.pop(file_path, None)
+            yield 'failed', file_path, chunk
+            continue
+        used, texts, seconds, peak_rss = chunk
+        record_extraction(used, len(texts), seconds)
+        file_stats = stats.setdefault(file_path, {"pages": 0, "seconds": 0.0, "peak_rss_bytes": 0})
+        file_stats["pages"] += len(texts)
+        file_stats["seconds"] += seconds
+        file_stats["peak_rss_bytes"] = max(file_stats["peak_rss_bytes"], peak_rss)
+        yield 'pages', file_path, texts
+
+        chunks_left[file_path] -= 1
+        if chunks_left[file_path] == 0:
+            del chunks_left[file_path]
+            file_stats = stats.pop(file_path)
+            # Worker time per file, so pooled and in-process extraction are comparable
+            metrics.record_span('extract', file_stats["seconds"])
+            print(
+                f"Extracted {os.path.basename(file_path)}: {file_stats['pages']} pages in "
+                f"{file_stats['seconds']:.2f}s, peak RSS +{file_stats['peak_rss_bytes'] / 1024 / 1024:.1f} MB"
+            )
+            yield 'done', file_path, file_stats
+
+def split_lines(text: str) -> List[str]:
+    """Split page text into stripped, non-empty lines"""
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+def parse_filename(filename: str):
+    """Return (magazine_id, issue_number) for a '{magazineId}_{issueNumber}.pdf' filename"""
+    magazine_id = filename.split('_')[0]
+    issue_number = filename.split('_')[1].replace('.pdf', '')
+    return magazine_id, issue_number
@@ -0,0 +1,193 @@
+"""
+Download -> extract -> index pipeline used by sync.
+
+Each stage runs in its own threads and hands files to the next through a bounded
+queue: a PDF is extracted as soon as its download completes and indexed as soon
+as its text is cached, so a new issue is searchable within seconds instead of
+after the whole batch. When a queue is full the stage feeding it waits, so a slow
+extractor holds downloads back rather than letting finished files pile up.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+from downloader import download_file, new_http_client
+from pdf_text import new_extract_pool
+from settings import DOWNLOAD_CONCURRENCY, EXTRACT_WORKERS, SYNC_QUEUE_SIZE
+from text_cache import cache_many
+
+STAGES = ('download', 'extract', 'index')
+
+# Queue marker: the stage feeding this queue has finished
+_DONE = None
+
+
+class Progress:
+    """Per-stage counters of one pipeline run, safe to read while it runs"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stages = {
+            stage: {"waiting": 0, "active": 0, "done": 0, "failed": 0, "seconds": 0.0}
+            for stage in STAGES
+        }
+        self._stages['download']["waiting"] = total
+
+    def queued(self, stage: str):
+        with self._lock:
+            self._stages[stage]["waiting"] += 1
+
+    def start(self, stage: str):
+        with self._lock:
+            self._stages[stage]["waiting"] -= 1
+            self._stages[stage]["active"] += 1
+
+    def skip(self, stage: str):
+        with self._lock:
+            self._stages[stage]["waiting"] -= 1
+
+    def finish(self, stage: str, ok: bool, seconds: float):
+        with self._lock:
+            counters = self._stages[stage]
+            counters["active"] -= 1
+            counters["done" if ok else "failed"] += 1
+            counters["seconds"] += seconds
+
+    def snapshot(self) -> Dict:
+        """Counters per stage, with the run's state and elapsed time"""
+        with self._lock:
+            stages = {
+                stage: {**counters, "seconds": round(counters["seconds"], 3)}
+                for stage, counters in self._stages.items()
+            }
+        return {
+            "running": self.finished_at is None,
+            "total": self.total,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 3),
+            "stages": stages
+        }
+
+
+def run_pipeline(
+    jobs: List[Tuple[Optional[str], str]],
+    index_file: Callable[[str], bool],
+    on_download: Optional[Callable[[str], None]] = None,
+    progress: Optional[Progress] = None
+) -> Dict[str, str]:
+    """
+    Download (url, file_path) jobs, extracting each PDF into the text cache once it
+    lands and indexing it once it is extracted. A job without a url is a PDF already
+    on disk and starts at extraction. index_file runs on the calling thread, which
+    may hold the index writer lock; on_download(file_path) runs on a download thread
+    for every successful download.
+    Returns {file_path: outcome} in job order, where outcome is 'indexed' or the
+    stage that failed ('download', 'extract' or 'index').
+    """
+    progress = progress or Progress(len(jobs))
+    outcomes: Dict[str, str] = {}
+    if not jobs:
+        progress.finished_at = time.time()
+        return outcomes
+
+    extract_queue: queue.Queue = queue.Queue(maxsize=SYNC_QUEUE_SIZE)
+    index_queue: queue.Queue = queue.Queue(maxsize=SYNC_QUEUE_SIZE)
+    extractors = max(1, EXTRACT_WORKERS)
+
+    def download(http, url: Optional[str], file_path: str):
+        if url is None:
+            progress.skip('download')
+            extract_queue.put(file_path)
+            progress.queued('extract')
+            return
+        progress.start('download')
+        started = time.perf_counter()
+        ok = download_file(http, url, file_path)
+        if ok and on_download:
+            try:
+                on_download(file_path)
+            except Exception as e:
+                print(f"Error recording {file_path}: {str(e)}")
+                ok = False
+        seconds = time.perf_counter() - started
+        metrics.record_span('download', seconds)
+        progress.finish('download', ok, seconds)
+        if not ok:
+            outcomes[file_path] = 'download'
+            return
+        # Blocks while extraction is behind
+        extract_queue.put(file_path)
+        progress.queued('extract')
+
+    def download_all():
+        concurrency = max(1, min(DOWNLOAD_CONCURRENCY, len(jobs)))
+        try:
+            with new_http_client(concurrency) as http, ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for future in [executor.submit(download, http, url, file_path) for url, file_path in jobs]:
+                    future.result()
+        except Exception as e:
+            print(f"Download stage failed: {str(e)}")
+        finally:
+            for _ in range(extractors):
+                extract_queue.put(_DONE)
+
+    def extract_all(pool):
+        while True:
+            file_path = extract_queue.get()
+            if file_path is _DONE:
+                break
+            progress.start('extract')
+            started = time.perf_counter()
+            try:
+                ok = file_path in cache_many([file_path], pool)
+            except Exception as e:
+                print(f"Error extracting {file_path}: {str(e)}")
+                ok = False
+            progress.finish('extract', ok, time.perf_counter() - started)
+            if not ok:
+                outcomes[file_path] = 'extract'
+                continue
+            # Blocks while indexing is behind
+            index_queue.put(file_path)
+            progress.queued('index')
+        index_queue.put(_DONE)
+
+    # Extraction threads share one process pool, so several small files parse at once
+    with new_extract_pool() if EXTRACT_WORKERS > 1 else nullcontext() as pool:
+        threads = [threading.Thread(target=download_all, name="sync-download", daemon=True)]
+        threads += [
+            threading.Thread(target=extract_all, args=(pool,), name=f"sync-extract-{i}", daemon=True)
+            for i in range(extractors)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Index on this thread, file by file; each commit makes an issue searchable
+        finished = 0
+        while finished < extractors:
+            file_path = index_queue.get()
+            if file_path is _DONE:
+                finished += 1
+                continue
+            progress.start('index')
+            started = time.perf_counter()
+            try:
+                ok = index_file(file_path)
+            except Exception as e:
+                print(f"Error indexing {file_path}: {str(e)}")
+                ok = False
+            seconds = time.perf_counter() - started
+            metrics.record_span('index', seconds)
+            progress.finish('index', ok, seconds)
+            outcomes[file_path] = 'indexed' if ok else 'index'
+
+        for thread in threads:
+            thread.join()
+    progress.finished_at = time.time()
+    return {file_path: outcomes.get(file_path, 'download') for _, file_path in jobs}
@@ -0,0 +1,276 @@
+import re
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+# Same tokenization the index uses for its terms
+WORD_RE = re.compile(r'\w+')
+
+# Field filters and the document column each one matches
+FIELDS = {
+    'magazine': 'magazine_id',
+    'issue': 'issue_number',
+}
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+LEXER_RE = re.compile(
+    r'\s*(?:'
+    r'(?P<phrase>"[^"]*"?)'
+    r'|(?P<lparen>\()'
+    r'|(?P<rparen>\))'
+    r'|(?P<minus>-(?=[^\s-]))'
+    r'|(?P<word>[^\s()"]+)'
+    r')'
+)
+
+# Anything that makes a query more than a plain substring search
+_ADVANCED_RE = re.compile(
+    r'["*()~]'
+    r'|(?:^|\s)-\w'
+    r'|(?:^|\s)(?:' + '|'.join(FIELDS) + r'):\S',
+    re.IGNORECASE
+)
+
+# Operators are only recognised in upper case, so 'rock and roll' stays a plain search
+_OPERATOR_RE = re.compile(r'\b(?:AND|OR|NOT)\b')
+
+# Unmistakable query-language use: a field filter or an operator between/before words
+_CLEAR_OPERATOR_RE = re.compile(
+    r'(?:^|\s)(?i:' + '|'.join(FIELDS) + r'):\S'
+    r'|\S\s+(?:AND|OR)\s+\S'
+    r'|(?:^|\s)NOT\s+\S'
+)
+
+
+class QuerySyntaxError(ValueError):
+    """Raised when a search query cannot be parsed or evaluated"""
+
+
+class Term(NamedTuple):
+    text: str
+
+
+class Prefix(NamedTuple):
+    text: str
+
+
+class Phrase(NamedTuple):
+    words: Tuple[str, ...]
+
+
+class Fuzzy(NamedTuple):
+    text: str
+    # None picks a bound from the word length
+    max_edits: Optional[int] = None
+
+
+class Field(NamedTuple):
+    name: str
+    value: str
+
+
+class Not(NamedTuple):
+    node: 'Node'
+
+
+class And(NamedTuple):
+    nodes: Tuple['Node', ...]
+
+
+class Or(NamedTuple):
+    nodes: Tuple['Node', ...]
+
+
+Node = Union[Term, Prefix, Fuzzy, Phrase, Field, Not, And, Or]
+
+
+def is_advanced(query: str) -> bool:
+    """
+    Check whether a query uses the query language. Plain keywords keep the
+    original case-insensitive substring behaviour, and so do keywords that only
+    look like queries: one that does not parse (e.g. 'ice)' or a lone 'OR') is
+    a plain keyword unless it clearly uses operators, in which case parsing it
+    reports the syntax error. The same goes for queries with nothing to search
+    for but exclusions, such as '-based'.
+    """
+    if not (_ADVANCED_RE.search(query) or _OPERATOR_RE.search(query)):
+        return False
+    try:
+        tree = parse_query(query)
+    except QuerySyntaxError:
+        return _has_clear_operators(query)
+    return bool(positive_terms(tree)) or _has_clear_operators(query)
+
+
+def _has_clear_operators(query: str) -> bool:
+    """Check for operator use that a malformed query should be reported for, not searched as text"""
+    if _CLEAR_OPERATOR_RE.search(query):
+        return True
+    quotes = query.count('"')
+    if quotes >= 2 and quotes % 2 == 0:
+        return True
+    return '(' in query and query.count('(') == query.count(')')
+
+
+def parse_query(query: str) -> Node:
+    """
+    Parse a query into a tree. Supported syntax:
+      word          exact term             word*        prefix
+      word~, word~1 typo-tolerant term (edit distance 1-2)
+      "a b c"       phrase within a line   magazine:ID  issue:N  field filters
+      a AND b, a b  both on the same page  a OR b       either
+      NOT a, -a     exclude pages          ( ... )      grouping
+    """
+    tokens = _lex(query)
+    parser = _Parser(tokens)
+    node = parser.parse_or()
+    if parser.position != len(tokens):
+        raise QuerySyntaxError(f"Unexpected '{tokens[parser.position][1]}' in query")
+    return node
+
+
+def positive_terms(node: Node) -> List[Node]:
+    """
+    Return the Term, Prefix, Fuzzy and Phrase nodes that contribute to relevance,
+    skipping anything under NOT.
+    """
+    if isinstance(node, (Term, Prefix, Fuzzy, Phrase)):
+        return [node]
+    if isinstance(node, (And, Or)):
+        return [term for child in node.nodes for term in positive_terms(child)]
+    return []
+
+
+def term_spans(query: str) -> List[Tuple[int, int]]:
+    """
+    Return the (start, end) offsets in `query` of the words that search the text,
+    which a spelling correction may rewrite. Operators, field filters, prefixes
+    and the edit bound of 'word~1' are left out, as is everything of a query
+    that does not lex.
+    """
+    if not is_advanced(query):
+        return [match.span() for match in WORD_RE.finditer(query)]
+    spans = []
+    position = len(query) - len(query.lstrip())
+    end = len(query.rstrip())
+    while position < end:
+        match = LEXER_RE.match(query, position, end)
+        if not match or match.end() == position:
+            return []
+        position = match.end()
+        kind = match.lastgroup
+        start = match.start(kind)
+        value = match.group(kind)
+        if kind == 'phrase':
+            spans.extend((start + m.start(), start + m.end()) for m in WORD_RE.finditer(value))
+        elif kind == 'word' and value not in OPERATORS and not value.endswith('*'):
+            name, sep, _ = value.partition(':')
+            if sep and name.lower() in FIELDS:
+                continue
+            text = re.sub(r'~[0-2]?$', '', value)
+            spans.extend((start + m.start(), start + m.end()) for m in WORD_RE.finditer(text))
+    return spans
+
+
+def fuzzy_query(keyword: str) -> str:
+    """Rewrite a plain keyword so every word in it matches typo-tolerantly"""
+    return ' '.join(f"{word}~" for word in WORD_RE.findall(keyword.lower()))
+
+
+def _lex(query: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = LEXER_RE.match(query, position)
+        if not match or match.end() == position:
+            raise QuerySyntaxError(f"Cannot parse query near '{query[position:]}'")
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+def _word_node(word: str) -> Node:
+    """Turn a bare word into a Term, Prefix, Field or (for 'e-mail' style words) Phrase"""
+    name, sep, value = word.partition(':')
+    if sep and name.lower() in FIELDS:
+        if not value:
+            raise QuerySyntaxError(f"Missing value for '{name}:'")
+        return Field(name.lower(), value)
+
+    fuzzy = re.fullmatch(r'(.+)~([0-2]?)', word)
+    if fuzzy:
+        words = WORD_RE.findall(fuzzy.group(1).lower())
+        if len(words) != 1:
+            raise QuerySyntaxError(f"Fuzzy term '{word}' must be a single word")
+        return Fuzzy(words[0], int(fuzzy.group(2)) if fuzzy.group(2) else None)
+
+    prefix = word.endswith('*')
+    words = WORD_RE.findall(word.rstrip('*').lower())
+    if not words:
+        raise QuerySyntaxError(f"'{word}' contains no searchable characters")
+    if prefix:
+        if len(words) > 1:
+            raise QuerySyntaxError(f"Prefix '{word}' must be a single word")
+        return Prefix(words[0])
+    if len(words) > 1:
+        return Phrase(tuple(words))
+    return Term(words[0])
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _is_operator(self, name: str) -> bool:
+        kind, value = self._peek()
+        return kind == 'word' and value == name
+
+    def parse_or(self) -> Node:
+        nodes = [self.parse_and()]
+        while self._is_operator('OR'):
+            self.position += 1
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else Or(tuple(nodes))
+
+    def parse_and(self) -> Node:
+        nodes = [self.parse_unary()]
+        while True:
+            kind, _ = self._peek()
+            if kind is None or kind == 'rparen' or self._is_operator('OR'):
+                break
+            if self._is_operator('AND'):
+                self.position += 1
+            nodes.append(self.parse_unary())
+        return nodes[0] if len(nodes) == 1 else And(tuple(nodes))
+
+    def parse_unary(self) -> Node:
+        kind, _ = self._peek()
+        if self._is_operator('NOT') or kind == 'minus':
+            self.position += 1
+            return Not(self.parse_unary())
+        return self.parse_atom()
+
+    def parse_atom(self) -> Node:
+        kind, value = self._peek()
+        if kind is None:
+            raise QuerySyntaxError("Query ends unexpectedly")
+        self.position += 1
+        if kind == 'lparen':
+            node = self.parse_or()
+            if self._peek()[0] != 'rparen':
+                raise QuerySyntaxError("Missing ')' in query")
+            self.position += 1
+            return node
+        if kind == 'phrase':
+            words = WORD_RE.findall(value.strip('"').lower())
+            if not words:
+                raise QuerySyntaxError("Empty phrase in query")
+            return Phrase(tuple(words)) if len(words) > 1 else Term(words[0])
+        if kind == 'word' and value not in OPERATORS:
+            return _word_node(value)
+        raise QuerySyntaxError(f"Unexpected '{value}' in query")
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional, Tuple
+
+from settings import RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS
+
+
+class CachedResponse(NamedTuple):
+    payload: bytes
+    # Issues the response returns results from, counted as demand each time it is served
+    issue_ids: Tuple[str, ...] = ()
+    # The raw keyword the response's suggestions were made for, if it has any
+    keyword: Optional[str] = None
+
+
+class ResultCache:
+    """
+    LRU cache of serialized search responses.
+    Every entry remembers the version it was built against (corpus and catalog);
+    a lookup with a different version is a miss, so syncs invalidate entries
+    without having to notify the cache. Entries also expire after `ttl` seconds,
+    and the least recently used ones are evicted once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL_SECONDS, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Hashable, keyword: Optional[str] = None) -> Optional[CachedResponse]:
+        """
+        Return the cached response for key if it was built for `version` and has not
+        expired. A response with suggestions is only returned for the keyword they were made for.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, entry_version, stored_at = entry
+                if (
+                    entry_version == version and time.time() - stored_at < self.ttl
+                    and response.keyword in (None, keyword)
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: Hashable, response: CachedResponse):
+        """Store a response, evicting least recently used entries to stay under max_bytes"""
+        if self.ttl <= 0 or len(response.payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (response, version, time.time())
+            self._bytes += len(response.payload)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _discard(self, key: Hashable):
+        response, _, _ = self._entries.pop(key)
+        self._bytes -= len(response.payload)
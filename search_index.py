@@ -0,0 +1,1070 @@
+import heapq
+from array import array
+import math
+import os
+import re
+import sqlite3
+import threading
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from aho_corasick import Automaton
+from corpus import Corpus, build_corpus
+from file_lock import index_lock
+from pdf_text import engine_name, parse_filename, split_lines
+from query import (
+    FIELDS, And, Field, Fuzzy, Node, Not, Or, Phrase, Prefix, QuerySyntaxError, Term,
+    is_advanced, parse_query, positive_terms, term_spans
+)
+from settings import INDEX_DIR, INDEX_MMAP_BYTES, MAGAZINES_DIR
+from text_cache import cache_many, iter_page_texts
+
+# Terms are maximal runs of word characters in the lowercased text
+TOKEN_RE = re.compile(r'\w+')
+
+# Bump whenever the schema or tokenization changes; older indexes are rebuilt
+SCHEMA_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE NOT NULL,
+    magazine_id TEXT NOT NULL,
+    issue_number TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    doc_id INTEGER NOT NULL,
+    page_number INTEGER NOT NULL,
+    line_number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (doc_id, page_number, line_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    doc_id INTEGER NOT NULL,
+    page_number INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, page_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term_id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL,
+    df INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    page_number INTEGER NOT NULL,
+    line_number INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (term_id, doc_id, page_number, line_number, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+CREATE TABLE IF NOT EXISTS term_trigrams (
+    trigram TEXT NOT NULL,
+    term_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, term_id)
+) WITHOUT ROWID;
+"""
+
+# SQLite limits the number of bound parameters per statement
+_MAX_VARS = 500
+
+# A search hit: (magazine_id, issue_number, page_number, line_number, context)
+Hit = Tuple[str, str, int, int, str]
+
+# A ranked hit: (bm25 score, hit, preview text around the matching line)
+RankedHit = Tuple[float, Hit, str]
+
+# Fuzzy terms of a parsed query mapped to their (term_id, term, distance) matches
+FuzzyExpansions = Dict[Fuzzy, List[Tuple[int, str, int]]]
+
+# BM25 parameters for page-level scoring
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Maximum length of a result preview
+PREVIEW_CHARS = 200
+
+# Most fuzzy candidates considered per misspelled word
+MAX_FUZZY_TERMS = 50
+
+# Most keyword tokens used to look up candidate lines (the rarest are kept);
+# the substring check covers the rest, and SQLite caps compound SELECTs at 500 arms
+MAX_CANDIDATE_TOKENS = 16
+
+# Plain keywords whose rarest token occurs on more than this fraction of the pages
+# (e.g. "e", "ing") scan the memory-mapped corpus: their postings would cover most lines
+CORPUS_SCAN_RATIO = 0.5
+
+
+class Matches:
+    """
+    Matching lines stored column-wise as integer arrays, one entry per hit.
+    Documents are referred to by doc_id only; their magazine and issue strings
+    live once in the documents table and are looked up for returned rows.
+    """
+    __slots__ = ('doc_ids', 'pages', 'lines')
+
+    def __init__(self):
+        self.doc_ids = array('l')
+        self.pages = array('l')
+        self.lines = array('l')
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def append(self, doc_id: int, page_number: int, line_number: int):
+        self.doc_ids.append(doc_id)
+        self.pages.append(page_number)
+        self.lines.append(line_number)
+
+    def key(self, i: int) -> Tuple[int, int, int]:
+        return self.doc_ids[i], self.pages[i], self.lines[i]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split lowercased text into index terms"""
+    return TOKEN_RE.findall(text)
+
+
+def trigrams(term: str) -> set:
+    """Trigrams of a term padded with '$' so short words and word edges still count"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def default_max_edits(word: str) -> int:
+    """Typo budget for a word: none for very short words, more for long ones"""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Edit distance between a and b where swapping two adjacent letters counts as one
+    edit (optimal string alignment). Returns limit + 1 once it is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i]
+        for j in range(1, len(b) + 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1])
+            )
+            if before is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit and (before is None or min(previous) > limit):
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def _match_case(term: str, word: str) -> str:
+    """Spell an indexed (lowercase) term the way the word it replaces was written"""
+    if word.isupper() and len(word) > 1:
+        return term.upper()
+    if word[:1].isupper():
+        return term.capitalize()
+    return term
+
+
+def _term_condition(keyword: str, start: int, end: int) -> Tuple[str, str]:
+    """
+    Build the vocabulary filter for the keyword token spanning [start, end).
+    A token bounded by non-word characters inside the keyword must line up
+    with the start/end of an indexed term; an unbounded side may continue.
+    """
+    token = keyword[start:end]
+    bounded_left = start > 0
+    bounded_right = end < len(keyword)
+    if bounded_left and bounded_right:
+        return 'term = ?', token
+    if bounded_left:
+        return 'term GLOB ?', token + '*'
+    if bounded_right:
+        return 'term GLOB ?', '*' + token
+    return 'instr(term, ?) > 0', token
+
+
+def _keyword_conditions(keyword: str) -> List[Tuple[str, str]]:
+    """Vocabulary filters for each token of a plain (substring) keyword"""
+    return [_term_condition(keyword, *match.span()) for match in TOKEN_RE.finditer(keyword)]
+
+
+def _candidate_conditions(conn: sqlite3.Connection, keyword: str) -> List[Tuple[str, str]]:
+    """
+    The distinct vocabulary filters of a plain keyword used to narrow candidate lines:
+    all of them, or the MAX_CANDIDATE_TOKENS that match the fewest postings
+    """
+    conditions = list(dict.fromkeys(_keyword_conditions(keyword)))
+    if len(conditions) <= MAX_CANDIDATE_TOKENS:
+        return conditions
+    return sorted(conditions, key=lambda condition: _condition_pages(conn, condition))[:MAX_CANDIDATE_TOKENS]
+
+
+def _condition_pages(conn: sqlite3.Connection, condition: Tuple[str, str]) -> int:
+    """Pages holding each term that matches a vocabulary filter, summed: a bound on its postings' reach"""
+    row = conn.execute(f'SELECT SUM(df) FROM terms WHERE {condition[0]}', (condition[1],)).fetchone()
+    return row[0] or 0
+
+
+def _scans_corpus(conn: sqlite3.Connection, conditions: List[Tuple[str, str]]) -> bool:
+    """
+    Whether a plain keyword with these candidate filters is matched by scanning the
+    corpus: it has no word characters to look up, or even its rarest token is too
+    common for the postings to narrow anything down
+    """
+    if not conditions:
+        return True
+    page_count = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+    limit = CORPUS_SCAN_RATIO * page_count
+    # Any selective filter settles it, so most keywords stop at their first token
+    return all(_condition_pages(conn, condition) > limit for condition in conditions)
+
+
+def _positive_conditions(tree: Node, fuzzy: FuzzyExpansions) -> List[Tuple[str, str]]:
+    """Vocabulary filters for the non-negated terms of a parsed query; fuzzy terms expand to their matches"""
+    conditions = []
+    for node in positive_terms(tree):
+        if isinstance(node, Prefix):
+            conditions.append(('term GLOB ?', node.text + '*'))
+        elif isinstance(node, Fuzzy):
+            conditions.extend(('term = ?', term) for _, term, _ in fuzzy[node])
+        elif isinstance(node, Phrase):
+            conditions.extend(('term = ?', word) for word in node.words)
+        else:
+            conditions.append(('term = ?', node.text))
+    return conditions
+
+
+def _fuzzy_expansions(conn: sqlite3.Connection, node: Node, expansions: Optional[FuzzyExpansions] = None) -> FuzzyExpansions:
+    """Expand every fuzzy term of a parsed query once, for matching and scoring alike"""
+    expansions = {} if expansions is None else expansions
+    if isinstance(node, Fuzzy):
+        if node not in expansions:
+            expansions[node] = _fuzzy_terms(conn, node.text, node.max_edits)
+    elif isinstance(node, Not):
+        _fuzzy_expansions(conn, node.node, expansions)
+    elif isinstance(node, (And, Or)):
+        for child in node.nodes:
+            _fuzzy_expansions(conn, child, expansions)
+    return expansions
+
+
+def _fuzzy_terms(conn: sqlite3.Connection, word: str, max_edits: Optional[int] = None) -> List[Tuple[int, str, int]]:
+    """
+    Return (term_id, term, distance) for indexed terms within max_edits of word,
+    closest and most frequent first. Candidates come from the trigram table, so the
+    cost depends on the vocabulary sharing the word's trigrams, not on the corpus size.
+    """
+    if max_edits is None:
+        max_edits = default_max_edits(word)
+    if max_edits == 0:
+        row = conn.execute('SELECT term_id FROM terms WHERE term = ? AND df > 0', (word,)).fetchone()
+        return [] if row is None else [(row[0], word, 0)]
+
+    grams = trigrams(word)
+    # An insert, delete or substitution touches at most three trigrams, a swap four
+    min_shared = len(grams) - 4 * max_edits
+    if min_shared <= 0:
+        # Too few trigrams for a count to rule anything out (4 letters with one edit, 8 with
+        # two). Terms within that budget still share a trigram with the word, or with the
+        # word after one adjacent swap ('from' -> 'form'), so one shared trigram is required
+        for i in range(len(word) - 1):
+            grams |= trigrams(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+        min_shared = 1
+    grams = sorted(grams)
+    placeholders = ','.join('?' * len(grams))
+    rows = conn.execute(
+        'SELECT t.term_id, t.term, t.df FROM term_trigrams g JOIN terms t USING (term_id) '
+        f'WHERE g.trigram IN ({placeholders}) AND length(t.term) BETWEEN ? AND ? AND t.df > 0 '
+        'GROUP BY t.term_id HAVING COUNT(*) >= ?',
+        grams + [len(word) - max_edits, len(word) + max_edits, min_shared]
+    )
+
+    matches = []
+    for term_id, term, df in rows:
+        distance = edit_distance(word, term, max_edits)
+        if distance <= max_edits:
+            matches.append((distance, -df, term, term_id))
+    matches.sort()
+    return [(term_id, term, distance) for distance, _, term, term_id in matches[:MAX_FUZZY_TERMS]]
+
+
+class SearchIndex:
+    """
+    Positional inverted index (term -> magazine/issue/page/line/position postings) stored in SQLite.
+    Each PDF is extracted once; the index is then updated per file.
+    """
+
+    def __init__(self, path: Optional[str] = None, init_schema: bool = True):
+        self.path = path or os.path.join(INDEX_DIR, 'search_index.sqlite')
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Memory-mapped lowercased text for substring scans, rebuilt when the corpus changes
+        self.corpus_path = os.path.join(directory, 'corpus.bin')
+        self._corpus: Optional[Corpus] = None
+        self._corpus_lock = threading.Lock()
+        # Processes sharing the directory take turns writing; readers never wait (WAL)
+        self.writer = index_lock('writer', directory)
+        if init_schema:
+            self.init_schema()
+
+    @contextmanager
+    def _connect(self, readonly: bool = False):
+        if readonly:
+            uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.path)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, timeout=30)
+        else:
+            conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not readonly:
+                conn.execute('PRAGMA journal_mode=WAL')
+            # Pages are read through the shared OS page cache rather than copied per connection
+            conn.execute(f'PRAGMA mmap_size={INDEX_MMAP_BYTES}')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_schema(self):
+        """
+        Create the tables, or rebuild them if the layout or extraction engine changed.
+        An index that is already current is only read, without waiting for the writer lock.
+        """
+        expected = {'schema_version': str(SCHEMA_VERSION), 'engine': engine_name()}
+        if os.path.exists(self.path):
+            try:
+                with self._connect(readonly=True) as conn:
+                    meta = dict(conn.execute('SELECT key, value FROM meta'))
+                if all(meta.get(key) == value for key, value in expected.items()):
+                    return
+            except sqlite3.OperationalError:
+                pass
+        # Workers starting together must not both decide to rebuild
+        with self.writer.hold(), self._connect() as conn:
+            conn.executescript(SCHEMA)
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            if all(meta.get(key) == value for key, value in expected.items()):
+                return
+            # Stale layout or a different extraction engine: drop everything and start over.
+            # The corpus version carries on past the old index and its corpus file, so neither
+            # that file nor a copy still mapped by another process can pass for the new index.
+            corpus = Corpus.open(self.corpus_path)
+            version = max(int(meta.get('corpus_version', 0)), corpus.version if corpus else 0) + 1
+            for table in ('term_trigrams', 'postings', 'terms', 'pages', 'lines', 'documents', 'meta'):
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                'INSERT INTO meta (key, value) VALUES (?, ?)',
+                [*expected.items(), ('corpus_version', str(version))]
+            )
+            if os.path.exists(self.corpus_path):
+                os.remove(self.corpus_path)
+
+    def indexed_files(self) -> Dict[str, Tuple[int, float]]:
+        """Return {filename: (size, mtime)} for every indexed PDF"""
+        with self._connect(readonly=True) as conn:
+            rows = conn.execute('SELECT filename, size, mtime FROM documents').fetchall()
+        return {filename: (size, mtime) for filename, size, mtime in rows}
+
+    def corpus_version(self) -> int:
+        """Counter that moves whenever a document is added, replaced or removed"""
+        with self._connect(readonly=True) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'corpus_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def corpus(self) -> Corpus:
+        """
+        The memory-mapped text of the index (see corpus.py), rebuilt first if documents
+        were added, replaced or removed since it was written. Sync calls this after
+        indexing so that searches find it current.
+        """
+        version = self.corpus_version()
+        with self._corpus_lock:
+            if self._corpus is None or self._corpus.version != version:
+                corpus = Corpus.open(self.corpus_path)
+                if corpus is None or corpus.version != version:
+                    # The writer rebuilds while other processes keep scanning the previous file;
+                    # with no file at all, building one beats waiting for the writer
+                    with self.writer.hold(blocking=False) as writing:
+                        if writing or corpus is None:
+                            with self._connect(readonly=True) as conn:
+                                build_corpus(conn, self.corpus_path)
+                            corpus = Corpus(self.corpus_path)
+                self._corpus = corpus
+            return self._corpus
+
+    def add_file(self, file_path: str, page_texts: Optional[Iterable[str]] = None):
+        """
+        (Re)index a single PDF, replacing any previous entry for it.
+        Pages are consumed one at a time, so `page_texts` may be a stream and only
+        the current page's rows are held in memory.
+        """
+        filename = os.path.basename(file_path)
+        magazine_id, issue_number = parse_filename(filename)
+        stat = os.stat(file_path)
+
+        # Extract outside the write transaction so other writers are not held up
+        if page_texts is None:
+            page_texts = iter_page_texts(file_path)
+
+        with self.writer.hold(), self._connect() as conn:
+            self._delete(conn, filename)
+            cursor = conn.execute(
+                'INSERT INTO documents (filename, magazine_id, issue_number, size, mtime) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (filename, magazine_id, issue_number, stat.st_size, stat.st_mtime)
+            )
+            doc_id = cursor.lastrowid
+            term_ids: Dict[str, int] = {}
+            # Pages each term appears on; feeds the BM25 idf
+            page_frequency: Dict[str, int] = defaultdict(int)
+
+            for page_num, text in enumerate(page_texts, start=1):
+                line_rows = []
+                line_tokens = []
+                for line_num, line in enumerate(split_lines(text), start=1):
+                    line_rows.append((doc_id, page_num, line_num, line))
+                    line_tokens.append((line_num, tokenize(line.lower())))
+                page_vocabulary = {term for _, tokens in line_tokens for term in tokens}
+                new_terms = sorted(page_vocabulary.difference(term_ids))
+                if new_terms:
+                    term_ids.update(self._term_ids(conn, new_terms))
+                for term in page_vocabulary:
+                    page_frequency[term] += 1
+
+                conn.executemany(
+                    'INSERT INTO lines (doc_id, page_number, line_number, text) VALUES (?, ?, ?, ?)',
+                    line_rows
+                )
+                conn.execute(
+                    'INSERT INTO pages (doc_id, page_number, length) VALUES (?, ?, ?)',
+                    (doc_id, page_num, sum(len(tokens) for _, tokens in line_tokens))
+                )
+                conn.executemany(
+                    'INSERT INTO postings (term_id, doc_id, page_number, line_number, position) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (term_ids[term], doc_id, page_num, line_num, position)
+                        for line_num, tokens in line_tokens
+                        for position, term in enumerate(tokens)
+                    ]
+                )
+
+            conn.executemany(
+                'UPDATE terms SET df = df + ? WHERE term_id = ?',
+                [(count, term_ids[term]) for term, count in page_frequency.items()]
+            )
+            self._bump_corpus_version(conn)
+
+    def remove_file(self, filename: str) -> bool:
+        """Drop a PDF from the index. Returns True if it was indexed."""
+        with self.writer.hold(), self._connect() as conn:
+            return self._delete(conn, filename)
+
+    def add_files(self, file_paths: List[str]) -> Dict[str, int]:
+        """
+        Index several PDFs, extracting any uncached text in parallel.
+        Text goes through the cache, so only one page is in memory at a time.
+        """
+        stats = {"indexed": 0, "failed": 0}
+        # Held throughout, so another process never parses the same files in parallel
+        with self.writer.hold():
+            cached = cache_many(file_paths)
+            for file_path in file_paths:
+                if file_path not in cached:
+                    stats["failed"] += 1
+                    metrics.inc('magazine_files_indexed_total', result='failed')
+                elif self.index_file(file_path):
+                    stats["indexed"] += 1
+                else:
+                    stats["failed"] += 1
+        return stats
+
+    def index_file(self, file_path: str) -> bool:
+        """
+        Index one PDF from the text cache (extracting it first on a miss).
+        Errors are reported rather than raised; returns whether it was indexed.
+        """
+        try:
+            self.add_file(file_path, iter_page_texts(file_path))
+        except Exception as e:
+            metrics.inc('magazine_files_indexed_total', result='failed')
+            print(f"Error indexing {os.path.basename(file_path)}: {str(e)}")
+            return False
+        metrics.inc('magazine_files_indexed_total', result='ok')
+        return True
+
+    def refresh(self, magazines_dir: str = MAGAZINES_DIR, keep: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Bring the index in line with the PDFs on disk, touching only changed files.
+        Documents named in `keep` stay indexed even without a local PDF (e.g. restored
+        from a snapshot); removing those is left to sync.
+        """
+        with self.writer.hold():
+            return self._refresh(magazines_dir, keep)
+
+    def _refresh(self, magazines_dir: str, keep: Iterable[str]) -> Dict[str, int]:
+        indexed = self.indexed_files()
+        on_disk = set()
+        changed = []
+
+        if os.path.exists(magazines_dir):
+            for filename in sorted(os.listdir(magazines_dir)):
+                if not filename.endswith('.pdf'):
+                    continue
+                on_disk.add(filename)
+                file_path = os.path.join(magazines_dir, filename)
+                stat = os.stat(file_path)
+                if indexed.get(filename) != (stat.st_size, stat.st_mtime):
+                    changed.append(file_path)
+
+        stats = self.add_files(changed) if changed else {"indexed": 0, "failed": 0}
+        stats["removed"] = 0
+        for filename in set(indexed) - on_disk - set(keep):
+            if self.remove_file(filename):
+                stats["removed"] += 1
+        return stats
+
+    def _matching_lines(self, conn: sqlite3.Connection, query: str, doc_id: Optional[int] = None):
+        """
+        Yield (doc_id, page_number, line_number, text) for every line matching
+        the query, in file/page/line order.
+        Passing doc_id restricts the lookup to a single document.
+        """
+        if is_advanced(query):
+            tree = parse_query(query)
+            return self._line_rows(conn, self._ordered_keys(conn, tree, _fuzzy_expansions(conn, tree), doc_id))
+
+        keyword = query.lower().strip()
+        conditions = _candidate_conditions(conn, keyword)
+        if _scans_corpus(conn, conditions):
+            return self._line_rows(conn, list(self.corpus().find(keyword, doc_id)))
+        return self._posting_lines(conn, keyword, conditions, doc_id)
+
+    def _posting_lines(
+        self, conn: sqlite3.Connection, keyword: str, conditions: List[Tuple[str, str]], doc_id: Optional[int] = None
+    ):
+        """Yield the rows of _matching_lines for a plain keyword, narrowed by its candidate filters"""
+        doc_filter = '' if doc_id is None else ' AND doc_id = ?'
+        doc_params = [] if doc_id is None else [doc_id]
+        # Candidate lines must contain a matching term for every (looked up) keyword token
+        selects = []
+        params = []
+        for condition, param in conditions:
+            selects.append(
+                'SELECT DISTINCT doc_id, page_number, line_number FROM postings '
+                f'WHERE term_id IN (SELECT term_id FROM terms WHERE {condition}){doc_filter}'
+            )
+            params.extend([param] + doc_params)
+        rows = conn.execute(
+            f'WITH hits AS ({" INTERSECT ".join(selects)}) '
+            'SELECT l.doc_id, l.page_number, l.line_number, l.text '
+            'FROM hits '
+            'JOIN lines l USING (doc_id, page_number, line_number) '
+            'JOIN documents d USING (doc_id) '
+            'ORDER BY d.filename, l.page_number, l.line_number',
+            params
+        )
+        # Postings narrow the candidates; the substring check keeps the old semantics
+        return (row for row in rows if keyword in row[3].lower())
+
+    def iter_search(self, query: str, magazines_dir: str = MAGAZINES_DIR) -> Iterator[Hit]:
+        """
+        Lazily yield hits one document at a time, in file/page/line order.
+        PDFs that are new or changed on disk are indexed just before they are
+        searched, and nothing past the last consumed document is touched, so
+        callers can stop early without paying for the rest of the corpus.
+        """
+        if is_advanced(query):
+            # Surface syntax errors before any document is touched
+            parse_query(query)
+        indexed = self.indexed_files()
+        on_disk = set()
+        if os.path.exists(magazines_dir):
+            on_disk = {filename for filename in os.listdir(magazines_dir) if filename.endswith('.pdf')}
+
+        for filename in sorted(set(indexed) | on_disk):
+            if filename in on_disk:
+                file_path = os.path.join(magazines_dir, filename)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    # Evicted by sync since the listing; the index still serves it
+                    stat = None
+                # Left as indexed if another process is writing; searches never wait for it
+                if stat and indexed.get(filename) != (stat.st_size, stat.st_mtime) and self.writer.acquire(blocking=False):
+                    try:
+                        self.add_file(file_path)
+                    except Exception as e:
+                        print(f"Error indexing {filename}: {str(e)}")
+                        continue
+                    finally:
+                        self.writer.release()
+            # Fetch one document's hits per connection so none is held across yields
+            with self._connect(readonly=True) as conn:
+                row = conn.execute(
+                    'SELECT doc_id, magazine_id, issue_number FROM documents WHERE filename = ?', (filename,)
+                ).fetchone()
+                hits = [] if row is None else [
+                    (row[1], row[2], *hit) for _, *hit in self._matching_lines(conn, query, row[0])
+                ]
+            yield from hits
+
+    def search_ranked(self, query: str, limit: int, offset: int = 0) -> Tuple[int, float, List[RankedHit]]:
+        """
+        Return (total matching lines, best score, one page of hits ranked by the
+        BM25 score of their page). Matches are kept as doc_id/page/line arrays;
+        text, previews and document details are only fetched for the returned page.
+        """
+        with self._connect(readonly=True) as conn:
+            matches, conditions = self._query_matches(conn, query)
+            return self._rank(conn, matches, self._page_scores(conn, conditions), limit, offset)
+
+    def search_ranked_many(self, queries: List[str], limit: int, offset: int = 0) -> List[Tuple[int, float, List[RankedHit]]]:
+        """
+        search_ranked for several queries, returning one result per query in order.
+        Plain keywords share a single pass over the candidate lines: an Aho-Corasick
+        automaton reports every keyword a line contains, so N keywords cost about one
+        scan instead of N. Query-language searches only touch postings and run one by one,
+        as do keywords too common to narrow down, which scan the corpus.
+        """
+        keywords: Dict[str, Matches] = {}
+        with self._connect(readonly=True) as conn:
+            for query in queries:
+                keyword = query.lower().strip()
+                if keyword in keywords or is_advanced(query):
+                    continue
+                if not _scans_corpus(conn, _candidate_conditions(conn, keyword)):
+                    keywords[keyword] = Matches()
+
+            if keywords:
+                automaton = Automaton(list(keywords))
+                columns = list(keywords.values())
+                for doc_id, page_number, line_number, text in self._candidate_lines(conn, list(keywords)):
+                    for index in automaton.find(text.lower()):
+                        columns[index].append(doc_id, page_number, line_number)
+
+            matched = []
+            for query in queries:
+                keyword = query.lower().strip()
+                if keyword in keywords and not is_advanced(query):
+                    matched.append((keywords[keyword], _keyword_conditions(keyword)))
+                else:
+                    # Query-language searches and keywords matched by a corpus scan
+                    matched.append(self._query_matches(conn, query))
+            all_scores = self._page_scores_many(conn, [conditions for _, conditions in matched])
+            return [
+                self._rank(conn, matches, page_scores, limit, offset)
+                for (matches, _), page_scores in zip(matched, all_scores)
+            ]
+
+    def suggest(self, query: str) -> List[str]:
+        """
+        "Did you mean" rewrites of a query: every search word that is not in the index
+        is replaced by its closest indexed term, in the word's case. Operators, field
+        filters, quotes and prefixes are kept as written. Returns [] when nothing can
+        be corrected.
+        """
+        spans = term_spans(query)
+        if not spans:
+            return []
+        corrected = query
+        changed = False
+        with self._connect(readonly=True) as conn:
+            # Right to left, so the offsets of the words still to fix stay valid
+            for start, end in reversed(spans):
+                word = query[start:end]
+                if conn.execute('SELECT 1 FROM terms WHERE term = ? AND df > 0', (word.lower(),)).fetchone():
+                    continue
+                matches = _fuzzy_terms(conn, word.lower())
+                if not matches:
+                    return []
+                corrected = corrected[:start] + _match_case(matches[0][1], word) + corrected[end:]
+                changed = True
+        return [corrected] if changed else []
+
+    def _evaluate_query(
+        self, conn: sqlite3.Connection, tree: Node, fuzzy: FuzzyExpansions, doc_id: Optional[int] = None
+    ) -> List[Tuple[int, int, int]]:
+        """Return the (doc_id, page_number, line_number) keys matching a parsed query"""
+        kind, matches = self._evaluate(conn, tree, fuzzy, doc_id)
+        if kind != 'lines':
+            raise QuerySyntaxError("Query needs at least one search term that is not negated")
+        return sorted((doc, page, line) for (doc, page), lines in matches.items() for line in lines)
+
+    def _evaluate(self, conn: sqlite3.Connection, node: Node, fuzzy: FuzzyExpansions, doc_id: Optional[int]):
+        """
+        Evaluate a query node. Returns one of
+          ('lines', {(doc_id, page): {line, ...}})  lines that match
+          ('exclude', {(doc_id, page): ...})         pages to drop (NOT of a term)
+          ('docs', (doc_ids, negated))               document filter (field or NOT field)
+        Conjunction works per page: a AND b keeps pages holding both, with the lines of each.
+        """
+        if isinstance(node, (Term, Prefix, Fuzzy, Phrase)):
+            return 'lines', self._term_lines(conn, node, fuzzy, doc_id)
+        if isinstance(node, Field):
+            column = FIELDS[node.name]
+            doc_ids = {row[0] for row in conn.execute(f'SELECT doc_id FROM documents WHERE {column} = ?', (node.value,))}
+            return 'docs', (doc_ids, False)
+        if isinstance(node, Not):
+            kind, value = self._evaluate(conn, node.node, fuzzy, doc_id)
+            if kind == 'lines':
+                return 'exclude', value
+            if kind == 'docs':
+                return 'docs', (value[0], not value[1])
+            raise QuerySyntaxError("Double negation is not supported")
+        if isinstance(node, Or):
+            results = [self._evaluate(conn, child, fuzzy, doc_id) for child in node.nodes]
+            kinds = {kind for kind, _ in results}
+            if kinds == {'lines'}:
+                merged = defaultdict(set)
+                for _, matches in results:
+                    for page, lines in matches.items():
+                        merged[page] |= lines
+                return 'lines', dict(merged)
+            if kinds == {'docs'} and not any(negated for _, (_, negated) in results):
+                return 'docs', (set().union(*(doc_ids for _, (doc_ids, _) in results)), False)
+            raise QuerySyntaxError("OR can only combine search terms with terms, or fields with fields")
+
+        # And
+        results = [self._evaluate(conn, child, fuzzy, doc_id) for child in node.nodes]
+        positives = [matches for kind, matches in results if kind == 'lines']
+        if not positives:
+            # Only filters/exclusions: not a search on its own, unless nested in a larger AND
+            docs = [value for kind, value in results if kind == 'docs']
+            if len(docs) == len(results) and all(not negated for _, negated in docs):
+                return 'docs', (set.intersection(*(doc_ids for doc_ids, _ in docs)), False)
+            raise QuerySyntaxError("Query needs at least one search term that is not negated")
+
+        pages = set.intersection(*(set(matches) for matches in positives))
+        for kind, value in results:
+            if kind == 'exclude':
+                pages -= set(value)
+            elif kind == 'docs':
+                doc_ids, negated = value
+                pages = {page for page in pages if (page[0] in doc_ids) != negated}
+        merged = {page: set() for page in pages}
+        for matches in positives:
+            for page in pages:
+                merged[page] |= matches[page]
+        return 'lines', merged
+
+    def _term_lines(
+        self, conn: sqlite3.Connection, node: Node, fuzzy: FuzzyExpansions, doc_id: Optional[int]
+    ) -> Dict[Tuple[int, int], set]:
+        """Lines containing a term, a prefix, a fuzzy match (expanded in `fuzzy`) or an exact phrase (consecutive positions)"""
+        doc_filter = '' if doc_id is None else ' AND p0.doc_id = ?'
+        doc_params = [] if doc_id is None else [doc_id]
+        if isinstance(node, Fuzzy):
+            term_ids = [term_id for term_id, _, _ in fuzzy[node]]
+            if not term_ids:
+                return {}
+            placeholders = ','.join('?' * len(term_ids))
+            sql = (
+                'SELECT DISTINCT p0.doc_id, p0.page_number, p0.line_number FROM postings p0 '
+                f'WHERE p0.term_id IN ({placeholders}){doc_filter}'
+            )
+            params = term_ids + doc_params
+        elif isinstance(node, Prefix):
+            sql = (
+                'SELECT DISTINCT p0.doc_id, p0.page_number, p0.line_number FROM postings p0 '
+                f'WHERE p0.term_id IN (SELECT term_id FROM terms WHERE term GLOB ?){doc_filter}'
+            )
+            params = [node.text + '*'] + doc_params
+        else:
+            words = node.words if isinstance(node, Phrase) else (node.text,)
+            term_ids = []
+            for word in words:
+                row = conn.execute('SELECT term_id FROM terms WHERE term = ?', (word,)).fetchone()
+                if row is None:
+                    return {}
+                term_ids.append(row[0])
+            # Each further word must sit at the next position on the same line
+            joins = ''.join(
+                f'JOIN postings p{i} ON p{i}.term_id = ? AND p{i}.doc_id = p0.doc_id '
+                f'AND p{i}.page_number = p0.page_number AND p{i}.line_number = p0.line_number '
+                f'AND p{i}.position = p0.position + {i} '
+                for i in range(1, len(term_ids))
+            )
+            sql = (
+                'SELECT DISTINCT p0.doc_id, p0.page_number, p0.line_number FROM postings p0 '
+                f'{joins}WHERE p0.term_id = ?{doc_filter}'
+            )
+            params = term_ids[1:] + term_ids[:1] + doc_params
+
+        matches = defaultdict(set)
+        for doc, page, line in conn.execute(sql, params):
+            matches[(doc, page)].add(line)
+        return dict(matches)
+
+    def _query_matches(self, conn: sqlite3.Connection, query: str) -> Tuple[Matches, List[Tuple[str, str]]]:
+        """Every line matching one query, with the vocabulary filters its pages are scored on"""
+        matches = Matches()
+        if is_advanced(query):
+            tree = parse_query(query)
+            fuzzy = _fuzzy_expansions(conn, tree)
+            for key in self._ordered_keys(conn, tree, fuzzy):
+                matches.append(*key)
+            return matches, _positive_conditions(tree, fuzzy)
+        keyword = query.lower().strip()
+        candidates = _candidate_conditions(conn, keyword)
+        if _scans_corpus(conn, candidates):
+            # Only the keys are needed, so the corpus scan skips fetching line text
+            for key in self.corpus().find(keyword):
+                matches.append(*key)
+        else:
+            for doc_id, page_number, line_number, _ in self._posting_lines(conn, keyword, candidates):
+                matches.append(doc_id, page_number, line_number)
+        return matches, _keyword_conditions(keyword)
+
+    def _candidate_lines(self, conn: sqlite3.Connection, keywords: List[str]):
+        """
+        Yield (doc_id, page_number, line_number, text) for every line that may contain
+        one of the plain keywords, in file/page/line order, each line once.
+        Every keyword must be selective enough to look up (see _scans_corpus).
+        """
+        selects = []
+        params = []
+        for keyword in keywords:
+            conditions = _candidate_conditions(conn, keyword)
+            # Postings narrow each keyword as in _matching_lines; the union covers them all.
+            # DISTINCT: a lone token otherwise yields the line once per posting (position).
+            selects.append('SELECT * FROM (' + ' INTERSECT '.join(
+                'SELECT DISTINCT doc_id, page_number, line_number FROM postings '
+                f'WHERE term_id IN (SELECT term_id FROM terms WHERE {condition})'
+                for condition, _ in conditions
+            ) + ')')
+            params.extend(param for _, param in conditions)
+        return conn.execute(
+            f'WITH hits AS ({" UNION ".join(selects)}) '
+            'SELECT l.doc_id, l.page_number, l.line_number, l.text '
+            'FROM hits '
+            'JOIN lines l USING (doc_id, page_number, line_number) '
+            'JOIN documents d USING (doc_id) '
+            'ORDER BY d.filename, l.page_number, l.line_number',
+            params
+        )
+
+    def _rank(
+        self,
+        conn: sqlite3.Connection,
+        matches: Matches,
+        page_scores: Dict[Tuple[int, int], float],
+        limit: int,
+        offset: int
+    ) -> Tuple[int, float, List[RankedHit]]:
+        """Select one page of matches by page score and fetch their text, details and previews"""
+        doc_ids, pages = matches.doc_ids, matches.pages
+
+        # Top-k selection over row numbers; ties keep file/page/line order
+        def rank(i: int) -> Tuple[float, int]:
+            return -page_scores.get((doc_ids[i], pages[i]), 0.0), i
+
+        top = heapq.nsmallest(offset + limit, range(len(matches)), key=rank)
+        best_score = -rank(top[0])[0] if top else 0.0
+        keys = [matches.key(i) for i in top[offset:]]
+        documents = self._documents(conn, {doc_id for doc_id, _, _ in keys})
+        return len(matches), best_score, [
+            (
+                page_scores.get((doc_id, page_number), 0.0),
+                documents[doc_id] + (page_number, line_number, text),
+                self._preview(conn, doc_id, page_number, line_number)
+            )
+            for doc_id, page_number, line_number, text in self._line_rows(conn, keys)
+        ]
+
+    def _ordered_keys(
+        self, conn: sqlite3.Connection, tree: Node, fuzzy: FuzzyExpansions, doc_id: Optional[int] = None
+    ) -> List[Tuple[int, int, int]]:
+        """The keys matching a parsed query, in file/page/line order"""
+        keys = self._evaluate_query(conn, tree, fuzzy, doc_id)
+        order = {row[0]: rank for rank, row in enumerate(conn.execute('SELECT doc_id FROM documents ORDER BY filename'))}
+        keys.sort(key=lambda key: (order[key[0]], key[1], key[2]))
+        return keys
+
+    def _line_rows(self, conn: sqlite3.Connection, keys: List[Tuple[int, int, int]]):
+        """Fetch (doc_id, page_number, line_number, text) rows for line keys"""
+        rows = []
+        for doc_id, page_number, line_number in keys:
+            row = conn.execute(
+                'SELECT text FROM lines WHERE doc_id = ? AND page_number = ? AND line_number = ?',
+                (doc_id, page_number, line_number)
+            ).fetchone()
+            if row is not None:
+                rows.append((doc_id, page_number, line_number, row[0]))
+        return rows
+
+    def _documents(self, conn: sqlite3.Connection, doc_ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple[str, str]]:
+        """Map doc_id to (magazine_id, issue_number), for every document or just the given ones"""
+        if doc_ids is None:
+            return {doc_id: (magazine_id, issue_number) for doc_id, magazine_id, issue_number in conn.execute(
+                'SELECT doc_id, magazine_id, issue_number FROM documents'
+            )}
+        doc_ids = list(doc_ids)
+        documents = {}
+        for i in range(0, len(doc_ids), _MAX_VARS):
+            chunk = doc_ids[i:i + _MAX_VARS]
+            rows = conn.execute(
+                f'SELECT doc_id, magazine_id, issue_number FROM documents WHERE doc_id IN ({",".join("?" * len(chunk))})',
+                chunk
+            )
+            documents.update((doc_id, (magazine_id, issue_number)) for doc_id, magazine_id, issue_number in rows)
+        return documents
+
+    def _page_scores(self, conn: sqlite3.Connection, conditions: List[Tuple[str, str]]) -> Dict[Tuple[int, int], float]:
+        """BM25 score of every page holding a term that matches one of the (condition, param) filters"""
+        if not conditions:
+            return {}
+        page_count, avg_length = conn.execute('SELECT COUNT(*), AVG(length) FROM pages').fetchone()
+        if not page_count:
+            return {}
+        avg_length = avg_length or 1.0
+
+        scores: Dict[Tuple[int, int], float] = defaultdict(float)
+        for condition, param in conditions:
+            rows = conn.execute(
+                'SELECT p.doc_id, p.page_number, t.df, COUNT(*), pg.length '
+                'FROM terms t '
+                'JOIN postings p USING (term_id) '
+                'JOIN pages pg USING (doc_id, page_number) '
+                f'WHERE {condition} '
+                'GROUP BY t.term_id, p.doc_id, p.page_number',
+                (param,)
+            )
+            for doc_id, page_number, df, tf, length in rows:
+                idf = math.log(1 + (page_count - df + 0.5) / (df + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[(doc_id, page_number)] += idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def _page_scores_many(
+        self,
+        conn: sqlite3.Connection,
+        condition_lists: List[List[Tuple[str, str]]]
+    ) -> List[Dict[Tuple[int, int], float]]:
+        """
+        _page_scores for several queries at once. Each distinct term's postings are
+        aggregated once and its per-page BM25 contribution is shared by every query using it.
+        """
+        page_count, avg_length = conn.execute('SELECT COUNT(*), AVG(length) FROM pages').fetchone()
+        if not page_count:
+            return [{} for _ in condition_lists]
+        avg_length = avg_length or 1.0
+
+        # Matching term ids per distinct filter
+        filter_terms: Dict[Tuple[str, str], List[int]] = {}
+        for conditions in condition_lists:
+            for condition, param in conditions:
+                if (condition, param) not in filter_terms:
+                    filter_terms[(condition, param)] = [
+                        term_id for (term_id,) in conn.execute(
+                            f'SELECT term_id FROM terms WHERE {condition} ORDER BY term_id', (param,)
+                        )
+                    ]
+
+        contributions: Dict[int, List[Tuple[Tuple[int, int], float]]] = defaultdict(list)
+        term_ids = sorted({term_id for ids in filter_terms.values() for term_id in ids})
+        for i in range(0, len(term_ids), _MAX_VARS):
+            chunk = term_ids[i:i + _MAX_VARS]
+            rows = conn.execute(
+                'SELECT t.term_id, p.doc_id, p.page_number, t.df, COUNT(*), pg.length '
+                'FROM terms t '
+                'JOIN postings p USING (term_id) '
+                'JOIN pages pg USING (doc_id, page_number) '
+                f'WHERE t.term_id IN ({",".join("?" * len(chunk))}) '
+                'GROUP BY t.term_id, p.doc_id, p.page_number',
+                chunk
+            )
+            for term_id, doc_id, page_number, df, tf, length in rows:
+                idf = math.log(1 + (page_count - df + 0.5) / (df + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                contributions[term_id].append(((doc_id, page_number), idf * tf * (BM25_K1 + 1) / norm))
+
+        all_scores = []
+        for conditions in condition_lists:
+            scores: Dict[Tuple[int, int], float] = defaultdict(float)
+            for condition in conditions:
+                for term_id in filter_terms[condition]:
+                    for page, score in contributions[term_id]:
+                        scores[page] += score
+            all_scores.append(scores)
+        return all_scores
+
+    def _preview(self, conn: sqlite3.Connection, doc_id: int, page_number: int, line_number: int) -> str:
+        """The matching line with its neighbours, trimmed to PREVIEW_CHARS"""
+        rows = conn.execute(
+            'SELECT text FROM lines WHERE doc_id = ? AND page_number = ? '
+            'AND line_number BETWEEN ? AND ? ORDER BY line_number',
+            (doc_id, page_number, line_number - 1, line_number + 1)
+        )
+        preview = ' '.join(text for (text,) in rows)
+        if len(preview) > PREVIEW_CHARS:
+            preview = preview[:PREVIEW_CHARS - 3].rstrip() + '...'
+        return preview
+
+    def _delete(self, conn: sqlite3.Connection, filename: str) -> bool:
+        row = conn.execute('SELECT doc_id FROM documents WHERE filename = ?', (filename,)).fetchone()
+        if row is None:
+            return False
+        doc_id = row[0]
+        page_counts = conn.execute(
+            'SELECT COUNT(DISTINCT page_number), term_id FROM postings WHERE doc_id = ? GROUP BY term_id',
+            (doc_id,)
+        ).fetchall()
+        conn.executemany('UPDATE terms SET df = df - ? WHERE term_id = ?', page_counts)
+        conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+        conn.execute('DELETE FROM pages WHERE doc_id = ?', (doc_id,))
+        conn.execute('DELETE FROM lines WHERE doc_id = ?', (doc_id,))
+        conn.execute('DELETE FROM documents WHERE doc_id = ?', (doc_id,))
+        self._bump_corpus_version(conn)
+        return True
+
+    def _bump_corpus_version(self, conn: sqlite3.Connection):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('corpus_version', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def _term_ids(self, conn: sqlite3.Connection, vocabulary: List[str]) -> Dict[str, int]:
+        term_ids = self._lookup_term_ids(conn, vocabulary)
+        new_terms = [term for term in vocabulary if term not in term_ids]
+        if new_terms:
+            conn.executemany('INSERT INTO terms (term) VALUES (?)', [(term,) for term in new_terms])
+            new_ids = self._lookup_term_ids(conn, new_terms)
+            # Only terms entering the vocabulary need their trigrams stored
+            conn.executemany(
+                'INSERT OR IGNORE INTO term_trigrams (trigram, term_id) VALUES (?, ?)',
+                [(gram, term_id) for term, term_id in new_ids.items() for gram in trigrams(term)]
+            )
+            term_ids.update(new_ids)
+        return term_ids
+
+    def _lookup_term_ids(self, conn: sqlite3.Connection, vocabulary: List[str]) -> Dict[str, int]:
+        term_ids = {}
+        for i in range(0, len(vocabulary), _MAX_VARS):
+            chunk = vocabulary[i:i + _MAX_VARS]
+            placeholders = ','.join('?' * len(chunk))
+            for term_id, term in conn.execute(
+                f'SELECT term_id, term FROM terms WHERE term IN ({placeholders})', chunk
+            ):
+                term_ids[term] = term_id
+        return term_ids
@@ -0,0 +1,63 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Base directory for downloaded and derived data; Vercel only allows writes under /tmp
+DATA_DIR = os.getenv('DATA_DIR', '/tmp' if os.getenv('VERCEL') else '')
+
+# Directory the downloaded magazine PDFs are stored in
+MAGAZINES_DIR = os.getenv('MAGAZINES_DIR', os.path.join(DATA_DIR, 'magazines'))
+
+# Directory for derived data such as the search index
+INDEX_DIR = os.getenv('INDEX_DIR', os.path.join(DATA_DIR, '.index'))
+
+# Prebuilt index shipped with the deployment (see snapshot.py), restored when INDEX_DIR has none
+INDEX_SNAPSHOT_DIR = os.getenv('INDEX_SNAPSHOT_DIR', 'snapshot')
+
+# Optional base URL to fetch the snapshot files from when none ships with the deployment
+INDEX_SNAPSHOT_URL = os.getenv('INDEX_SNAPSHOT_URL', '')
+
+# Seconds between background catalog syncs; 0 disables the refresher
+SYNC_INTERVAL_SECONDS = float(os.getenv('SYNC_INTERVAL_SECONDS', '300'))
+
+# Worker processes used for PDF text extraction; 1 extracts in-process
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+
+# Maximum number of magazine downloads in flight at once
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '8'))
+
+# PDF text extraction engine: 'pymupdf' (fast) or 'pypdf2'
+PDF_ENGINE = os.getenv('PDF_ENGINE', 'pymupdf').lower()
+
+# Seconds a catalog snapshot is served before it is revalidated against Firebase
+CATALOG_TTL_SECONDS = float(os.getenv('CATALOG_TTL_SECONDS', '60'))
+
+# Seconds a cached search response is served; 0 disables the result cache
+RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', '300'))
+
+# Upper bound on the memory held by cached search responses
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Fraction of search requests logged with their per-stage timings (0 disables, 1 logs all)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+
+# PDFs larger than this are not downloaded or parsed
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_BYTES', str(512 * 1024 * 1024)))
+
+# Pages past this limit are not extracted or indexed
+MAX_PDF_PAGES = int(os.getenv('MAX_PDF_PAGES', '2000'))
+
+# Bytes of the search index SQLite reads through mmap; the OS page cache is shared by all workers
+INDEX_MMAP_BYTES = int(os.getenv('INDEX_MMAP_BYTES', str(256 * 1024 * 1024)))
+
+# Files allowed to wait between sync stages; a full queue pauses the stage before it
+SYNC_QUEUE_SIZE = int(os.getenv('SYNC_QUEUE_SIZE', '4'))
+
+# Disk budget for downloaded PDFs plus INDEX_DIR; past it, indexed PDFs are deleted and fetched again when needed
+# (0 = unbounded). On Vercel, 128 MiB of the 512 MiB /tmp stay free for in-flight downloads and SQLite temp files
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(384 * 1024 * 1024) if os.getenv('VERCEL') else '0'))
+
+# Which PDFs go first when over budget: 'lru' (least recently returned by a search) or 'lfu' (returned least often)
+PDF_CACHE_POLICY = os.getenv('PDF_CACHE_POLICY', 'lru').lower()
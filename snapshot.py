@@ -0,0 +1,114 @@
+"""
+Prebuilt index snapshots for cold starts.
+
+A fresh serverless instance has no PDFs and no index. Building one means
+downloading and parsing every issue, so instead a snapshot of the search index
+and manifest is built ahead of time and either shipped with the deployment
+(vercel.json includeFiles) or fetched from INDEX_SNAPSHOT_URL. It is restored
+into INDEX_DIR before the index is opened, and searches work immediately.
+
+    python snapshot.py            # refresh the local index and write ./snapshot
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from file_lock import index_lock
+from settings import INDEX_DIR, INDEX_SNAPSHOT_DIR, INDEX_SNAPSHOT_URL, MAGAZINES_DIR
+
+# Databases that make up a snapshot; the text cache is only needed to re-index
+SNAPSHOT_FILES = ('search_index.sqlite', 'manifest.sqlite')
+
+
+def build_snapshot(index_dir: str = INDEX_DIR, snapshot_dir: str = INDEX_SNAPSHOT_DIR) -> list:
+    """
+    Copy the live databases into snapshot_dir through SQLite's backup API, so the
+    copy is consistent even while the index is being written. Returns the files written.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    written = []
+    for filename in SNAPSHOT_FILES:
+        source_path = os.path.join(index_dir, filename)
+        if not os.path.exists(source_path):
+            continue
+        target_path = os.path.join(snapshot_dir, filename)
+        fd, temp_path = tempfile.mkstemp(dir=snapshot_dir, prefix=f".{filename}.", suffix='.part')
+        os.close(fd)
+        try:
+            source = sqlite3.connect(source_path)
+            target = sqlite3.connect(temp_path)
+            try:
+                source.backup(target)
+                # A single self-contained file: no -wal/-shm companions to ship
+                target.execute('PRAGMA journal_mode=DELETE')
+                target.execute('VACUUM')
+            finally:
+                target.close()
+                source.close()
+            # mkstemp creates owner-only files; the snapshot ships with the deployment
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target_path)
+            written.append(target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return written
+
+
+def restore_snapshot(
+    index_dir: str = INDEX_DIR,
+    snapshot_dir: str = INDEX_SNAPSHOT_DIR,
+    url: str = INDEX_SNAPSHOT_URL
+) -> bool:
+    """
+    Seed an empty INDEX_DIR from the shipped snapshot, or from `url` when none ships.
+    Does nothing if an index already exists. Returns True when a snapshot was restored.
+    """
+    if os.path.exists(os.path.join(index_dir, SNAPSHOT_FILES[0])):
+        return False
+    # Workers starting together restore once; the rest then find the index in place
+    with index_lock('writer', index_dir).hold():
+        return _restore_snapshot(index_dir, snapshot_dir, url)
+
+
+def _restore_snapshot(index_dir: str, snapshot_dir: str, url: str) -> bool:
+    if os.path.exists(os.path.join(index_dir, SNAPSHOT_FILES[0])):
+        return False
+    os.makedirs(index_dir, exist_ok=True)
+
+    if os.path.exists(os.path.join(snapshot_dir, SNAPSHOT_FILES[0])):
+        for filename in SNAPSHOT_FILES:
+            source_path = os.path.join(snapshot_dir, filename)
+            if os.path.exists(source_path):
+                # Copy, then rename, so a crash never leaves a half-written database behind
+                temp_path = os.path.join(index_dir, f".{filename}.part")
+                shutil.copyfile(source_path, temp_path)
+                os.replace(temp_path, os.path.join(index_dir, filename))
+        print(f"Restored index snapshot from {snapshot_dir}")
+        return True
+
+    if url:
+        from downloader import download_many
+
+        jobs = [(f"{url.rstrip('/')}/{filename}", os.path.join(index_dir, filename)) for filename in SNAPSHOT_FILES]
+        outcomes = download_many(jobs)
+        if outcomes.get(jobs[0][1]):
+            print(f"Restored index snapshot from {url}")
+            return True
+        # A manifest without its index would make sync skip issues it cannot serve
+        for _, file_path in jobs:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    return False
+
+
+if __name__ == "__main__":
+    from search_index import SearchIndex
+
+    print(f"Refreshing index from {MAGAZINES_DIR}")
+    print(SearchIndex().refresh(MAGAZINES_DIR))
+    for path in build_snapshot():
+        print(f"✓ Wrote {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+    sys.exit(0)
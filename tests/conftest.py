@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read on import: keep the tests' data out of the working copy
+_data_dir = tempfile.mkdtemp(prefix='magazine-tests-')
+os.environ.update({
+    'MAGAZINES_DIR': os.path.join(_data_dir, 'magazines'),
+    'INDEX_DIR': os.path.join(_data_dir, '.index'),
+    'INDEX_SNAPSHOT_DIR': os.path.join(_data_dir, 'snapshot'),
+    'SYNC_INTERVAL_SECONDS': '0',
+    'EXTRACT_WORKERS': '1',
+})
+
+from search_index import SearchIndex
+
+# Page texts per issue, indexed without going through PDF extraction
+PAGES = {
+    '1000_1.pdf': [
+        'The cat and the hat\nLaptop reviews: the best of the year\nIce-cold servers',
+        'Service manual for the LAPTOP\nnothing here',
+    ],
+    '1001_2.pdf': [
+        'Serverless everything\nthe the the\nPrice: $99 (ice)\n'
+        'one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen seventeen eighteen',
+    ],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    search_index = SearchIndex(str(tmp_path / 'index' / 'search_index.sqlite'))
+    for filename, pages in PAGES.items():
+        file_path = tmp_path / filename
+        file_path.write_bytes(b'%PDF-1.4')
+        search_index.add_file(str(file_path), pages)
+    return search_index
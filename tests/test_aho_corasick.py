@@ -0,0 +1,23 @@
+import pytest
+
+from aho_corasick import Automaton
+
+
+@pytest.mark.parametrize('keywords, text, found', [
+    (['he', 'she', 'his', 'hers'], 'ushers', {0, 1, 3}),
+    (['abcd', 'bc', 'c'], 'xabcx', {1, 2}),
+    (['aa', 'aaa'], 'aa', {0}),
+    (['ice', 'ice)', '$99'], 'price: $99 (ice)', {0, 1, 2}),
+    (['a', 'a'], 'a', {0, 1}),
+    (['laptop'], '', set()),
+    ([''], 'anything', {0}),
+])
+def test_find(keywords, text, found):
+    assert Automaton(keywords).find(text) == found
+
+
+def test_find_matches_substring_check():
+    keywords = ['the', 'he', 'e', 'ther', 'there', 'her', 'ere', 'rer']
+    automaton = Automaton(keywords)
+    for text in ['there', 'whether or not', 'rerere', 'hhe', 'ttheree', 'xyz']:
+        assert automaton.find(text) == {i for i, keyword in enumerate(keywords) if keyword in text}, text
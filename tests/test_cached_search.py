@@ -0,0 +1,114 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pymupdf
+import pytest
+from fastapi.testclient import TestClient
+
+import index as api
+from catalog import CatalogSnapshot
+from manifest import Manifest
+from pdf_cache import PdfCache
+from result_cache import ResultCache
+
+MAGAZINES = {'1000': {'title': 'Tech Monthly'}, '1001': {'title': 'Cloud Weekly'}}
+ISSUES = {
+    'issue-a': {'magazineId': '1000', 'issueNumber': '1', 'pdfFileId': 'file-a'},
+    'issue-b': {'magazineId': '1001', 'issueNumber': '2', 'pdfFileId': 'file-b'},
+}
+
+
+@pytest.fixture
+def service(index, tmp_path, monkeypatch):
+    """index.py's search path over the conftest index (whose PDFs sit in tmp_path) and a fixed catalog"""
+    state = SimpleNamespace(snapshot=CatalogSnapshot(MAGAZINES, ISSUES, time.time()), refreshes=0)
+    refresh = index.refresh
+
+    def counting_refresh(*args, **kwargs):
+        state.refreshes += 1
+        return refresh(*args, **kwargs)
+
+    monkeypatch.setattr(index, 'refresh', counting_refresh)
+    monkeypatch.setattr(api, 'MAGAZINES_DIR', str(tmp_path))
+    monkeypatch.setattr(api, 'search_index', index)
+    state.manifest = Manifest(str(tmp_path / 'index' / 'manifest.sqlite'))
+    monkeypatch.setattr(api, 'manifest', state.manifest)
+    monkeypatch.setattr(api, 'pdf_cache', PdfCache(state.manifest, str(tmp_path), 0))
+    monkeypatch.setattr(api, 'catalog', SimpleNamespace(get=lambda: state.snapshot))
+    monkeypatch.setattr(api, 'result_cache', ResultCache())
+    monkeypatch.setattr(api, '_refreshed_mtime', None)
+    state.search = lambda keyword: json.loads(api.cached_search_response(keyword, 20, 0)[0])
+    return state
+
+
+def test_cache_hits_do_not_refresh_the_index(service):
+    assert service.search('laptop')["total_matches"] == 2
+    assert service.search('laptop')["total_matches"] == 2
+    assert service.search('server')["total_matches"] == 2
+    # Only the first miss lists the directory; it has not changed since
+    assert service.refreshes == 1
+    assert api.result_cache.hits == 1
+
+
+def test_corpus_or_catalog_changes_invalidate_cached_responses(service, index, tmp_path):
+    titles = lambda: {result["magazine_title"] for result in service.search('server')["results"]}
+    assert titles() == {'Tech Monthly', 'Cloud Weekly'}
+    service.snapshot = CatalogSnapshot({**MAGAZINES, '1000': {'title': 'Gadget Monthly'}}, ISSUES, time.time(), 2)
+    assert titles() == {'Gadget Monthly', 'Cloud Weekly'}
+
+    (tmp_path / '1001_2.pdf').unlink()
+    index.refresh(str(tmp_path))
+    assert titles() == {'Gadget Monthly'}
+    assert api.result_cache.hits == 0
+
+
+def test_suggestions_keep_the_case_of_the_keyword(service):
+    assert service.search('Laptp')["suggestions"] == ['Laptop']
+    assert service.search('laptp')["suggestions"] == ['laptop']
+    assert service.search('laptp')["suggestions"] == ['laptop']
+    assert api.result_cache.hits == 1
+
+
+def test_catalog_age_is_sent_as_a_header(service):
+    service.snapshot = CatalogSnapshot(MAGAZINES, ISSUES, time.time() - 60)
+    client = TestClient(api.app)
+    for _ in range(2):
+        response = client.get('/search/laptop')
+        assert 'catalog_age_seconds' not in response.json()
+        assert float(response.headers['X-Catalog-Age']) >= 60
+
+
+def test_misses_index_pdfs_added_to_the_directory(service, tmp_path):
+    assert service.search('zebra')["total_matches"] == 0
+    document = pymupdf.open()
+    document.new_page().insert_text((72, 72), 'Zebra crossing')
+    document.save(str(tmp_path / '1002_3.pdf'))
+
+    # The next miss picks it up; cached responses stand until they expire
+    assert service.search('zebra')["total_matches"] == 0
+    assert service.search('crossing')["total_matches"] == 1
+    assert service.refreshes == 2
+
+
+def test_first_request_opens_the_index(service, monkeypatch):
+    restores = []
+    monkeypatch.setattr(api, '_index_opened', False)
+    monkeypatch.setattr(api, 'restore_snapshot', lambda: restores.append(True))
+    # Not entered as a context manager, so no lifespan events, as on some serverless runtimes
+    client = TestClient(api.app)
+    assert client.get('/search/laptop').json()["total_matches"] == 2
+    assert client.get('/search/server').json()["total_matches"] == 2
+    assert restores == [True]
+
+
+def test_served_responses_count_as_pdf_demand(service):
+    for filename, issue_id in [('1000_1.pdf', 'issue-a'), ('1001_2.pdf', 'issue-b')]:
+        service.manifest.record(filename, issue_id, f"file-{issue_id}", 0, 'sha')
+    service.search('laptop')
+    service.search('laptop')
+    service.search('serverless')
+    api.pdf_cache.flush()
+    usage = service.manifest.usage()
+    # The second 'laptop' is a cache hit and still counts
+    assert {filename: uses for filename, (_, uses) in usage.items()} == {'1000_1.pdf': 2, '1001_2.pdf': 1}
@@ -0,0 +1,83 @@
+import threading
+from types import SimpleNamespace
+
+import firebase_admin.db
+import pytest
+
+import catalog
+from catalog import CatalogCache
+
+
+class FakeReference:
+    """firebase_admin.db.Reference over an in-memory tree whose ETag is its revision"""
+
+    def __init__(self, database, path: str):
+        self.database = database
+        self.path = path
+
+    def get(self, etag: bool = False):
+        self.database.calls.append(('get', self.path))
+        return self.database.trees[self.path], self._etag()
+
+    def get_if_changed(self, etag: str):
+        self.database.calls.append(('get_if_changed', self.path))
+        if etag == self._etag():
+            return False, None, etag
+        return True, self.database.trees[self.path], self._etag()
+
+    def _etag(self) -> str:
+        return f"{self.path}-{self.database.revisions[self.path]}"
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = SimpleNamespace(
+        trees={'magazines': {'1000': {'title': 'Tech Monthly'}}, 'magazine_issues': {}},
+        revisions={'magazines': 1, 'magazine_issues': 1},
+        calls=[]
+    )
+    monkeypatch.setattr(catalog, 'init_firebase', lambda: None)
+    monkeypatch.setattr(firebase_admin.db, 'reference', lambda path: FakeReference(database, path))
+    return database
+
+
+def test_fresh_snapshots_are_served_without_fetching(database):
+    cache = CatalogCache(ttl=60)
+    snapshot = cache.get()
+    assert snapshot.titles == {'1000': 'Tech Monthly'}
+    assert cache.get() is snapshot
+    assert database.calls == [('get', 'magazines'), ('get', 'magazine_issues')]
+
+
+def test_unchanged_trees_are_revalidated_not_downloaded(database):
+    cache = CatalogCache(ttl=60)
+    first = cache.refresh()
+    database.calls.clear()
+    second = cache.refresh()
+    assert database.calls == [('get_if_changed', 'magazines'), ('get_if_changed', 'magazine_issues')]
+    assert second.version == first.version
+    assert second.magazines is first.magazines
+
+
+def test_changed_trees_move_the_version(database):
+    cache = CatalogCache(ttl=60)
+    first = cache.refresh()
+    database.trees['magazines'] = {'1000': {'title': 'Gadget Monthly'}}
+    database.revisions['magazines'] += 1
+    second = cache.refresh()
+    assert second.version == first.version + 1
+    assert second.titles == {'1000': 'Gadget Monthly'}
+    # The unchanged tree is carried over from the previous snapshot
+    assert second.magazine_issues is first.magazine_issues
+
+
+def test_expired_snapshots_are_served_while_revalidating(database):
+    cache = CatalogCache(ttl=0)
+    first = cache.refresh()
+    database.revisions['magazines'] += 1
+    # Served as is; the refresh runs in the background
+    assert cache.get() is first
+    for thread in threading.enumerate():
+        if thread.name == 'catalog-refresh':
+            thread.join()
+    assert cache._snapshot.version == first.version + 1
@@ -0,0 +1,55 @@
+import httpx
+
+from downloader import download_file
+
+
+def client(handler) -> httpx.Client:
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def chunks(*parts: bytes, error: Exception = None):
+    """A streamed body without a content-length, optionally cut off by error"""
+    yield from parts
+    if error is not None:
+        raise error
+
+
+def test_download_replaces_the_file_once_complete(tmp_path):
+    target = tmp_path / '1000_1.pdf'
+    target.write_bytes(b'old')
+    http = client(lambda request: httpx.Response(200, content=chunks(b'%PDF-', b'1.4')))
+    assert download_file(http, 'https://storage.test/file', str(target))
+    assert target.read_bytes() == b'%PDF-1.4'
+    assert [path.name for path in tmp_path.iterdir()] == ['1000_1.pdf']
+
+
+def test_interrupted_download_keeps_the_previous_file(tmp_path):
+    target = tmp_path / '1000_1.pdf'
+    target.write_bytes(b'old')
+    body = chunks(b'%PDF-', error=httpx.ReadError('connection reset'))
+    http = client(lambda request: httpx.Response(200, content=body))
+    assert not download_file(http, 'https://storage.test/file', str(target))
+    assert target.read_bytes() == b'old'
+    assert [path.name for path in tmp_path.iterdir()] == ['1000_1.pdf']
+
+
+def test_failed_status_writes_nothing(tmp_path):
+    http = client(lambda request: httpx.Response(404))
+    assert not download_file(http, 'https://storage.test/file', str(tmp_path / '1000_1.pdf'))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_declared_size_over_the_limit_is_skipped(tmp_path):
+    # Bytes content is sent with a content-length, so the body is never read
+    http = client(lambda request: httpx.Response(200, content=b'x' * 100))
+    assert not download_file(http, 'https://storage.test/file', str(tmp_path / '1000_1.pdf'), max_bytes=99)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_streamed_size_over_the_limit_is_abandoned(tmp_path):
+    http = client(lambda request: httpx.Response(200, content=chunks(b'x' * 60, b'x' * 60)))
+    assert not download_file(http, 'https://storage.test/file', str(tmp_path / '1000_1.pdf'), max_bytes=100)
+    assert list(tmp_path.iterdir()) == []
+    # Exactly at the limit is fine
+    http = client(lambda request: httpx.Response(200, content=chunks(b'x' * 60, b'x' * 40)))
+    assert download_file(http, 'https://storage.test/file', str(tmp_path / '1000_1.pdf'), max_bytes=100)
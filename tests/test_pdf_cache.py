@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+from manifest import Manifest
+from pdf_cache import PdfCache
+
+FILES = {'1000_1.pdf': 'issue-a', '1000_2.pdf': 'issue-b', '1000_3.pdf': 'issue-c'}
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    """Three tracked, indexed 100-byte PDFs; returns (manifest, magazines dir, indexed)"""
+    magazines_dir = tmp_path / 'magazines'
+    magazines_dir.mkdir()
+    manifest = Manifest(str(tmp_path / 'index' / 'manifest.sqlite'))
+    indexed = {}
+    for filename, issue_id in FILES.items():
+        file_path = magazines_dir / filename
+        file_path.write_bytes(b'x' * 100)
+        manifest.record(filename, issue_id, f"file-{issue_id}", 100, 'sha')
+        stat = os.stat(file_path)
+        indexed[filename] = (stat.st_size, stat.st_mtime)
+    return manifest, magazines_dir, indexed
+
+
+def new_cache(manifest, magazines_dir, max_bytes, policy='lru', index_dir=None):
+    return PdfCache(manifest, str(magazines_dir), max_bytes, policy, index_dir or str(magazines_dir / 'no-index'))
+
+
+@pytest.mark.parametrize('policy, evicted', [('lru', ['1000_3.pdf', '1000_1.pdf']), ('lfu', ['1000_3.pdf', '1000_2.pdf'])])
+def test_evicts_pdfs_in_least_demand(pdfs, policy, evicted):
+    manifest, magazines_dir, indexed = pdfs
+    cache = new_cache(manifest, magazines_dir, 100, policy)
+    cache.record_demand(['issue-a', 'issue-a', 'issue-a'])
+    cache.flush()
+    time.sleep(0.01)
+    # issue-a is in the most frequent demand, issue-b in the most recent; issue-c has none
+    cache.record_demand(['issue-b'])
+    assert cache.evict(indexed) == evicted
+    assert sorted(os.listdir(magazines_dir)) == sorted(set(FILES) - set(evicted))
+
+
+def test_only_tracked_indexed_pdfs_are_evicted(pdfs):
+    manifest, magazines_dir, indexed = pdfs
+    manifest.remove('1000_1.pdf')
+    del indexed['1000_2.pdf']
+    assert new_cache(manifest, magazines_dir, 1).evict(indexed) == ['1000_3.pdf']
+
+
+def test_index_files_count_toward_the_budget(pdfs, tmp_path):
+    manifest, magazines_dir, indexed = pdfs
+    index_dir = tmp_path / 'index'
+    assert new_cache(manifest, magazines_dir, 300).evict(indexed) == []
+    cache = new_cache(manifest, magazines_dir, 300 + os.path.getsize(index_dir / 'manifest.sqlite') - 1, index_dir=str(index_dir))
+    assert cache.stats()["index_bytes"] == os.path.getsize(index_dir / 'manifest.sqlite')
+    assert len(cache.evict(indexed)) == 1
+
+
+def test_unbounded_cache_keeps_everything(pdfs):
+    manifest, magazines_dir, indexed = pdfs
+    assert new_cache(manifest, magazines_dir, 0).evict(indexed) == []
@@ -0,0 +1,90 @@
+import pymupdf
+import pytest
+
+import pipeline
+from pipeline import Progress, run_pipeline
+
+
+def write_pdf(file_path, text):
+    document = pymupdf.open()
+    document.new_page().insert_text((72, 72), text)
+    document.save(str(file_path))
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Serve downloads from a {url: writer} map; a url without one fails"""
+    served = {}
+
+    def download_file(http, url, file_path):
+        if url not in served:
+            return False
+        served[url](file_path)
+        return True
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    return served
+
+
+def test_outcomes_name_the_stage_that_failed(tmp_path, downloads):
+    path = lambda name: str(tmp_path / name)
+    downloads['https://storage.test/good'] = lambda file_path: write_pdf(file_path, 'Laptop reviews')
+    downloads['https://storage.test/broken'] = lambda file_path: open(file_path, 'wb').write(b'not a pdf')
+    downloads['https://storage.test/rejected'] = lambda file_path: write_pdf(file_path, 'Rejected')
+    write_pdf(tmp_path / 'local.pdf', 'Already on disk')
+    jobs = [
+        ('https://storage.test/good', path('good.pdf')),
+        ('https://storage.test/missing', path('missing.pdf')),
+        ('https://storage.test/broken', path('broken.pdf')),
+        ('https://storage.test/rejected', path('rejected.pdf')),
+        (None, path('local.pdf')),
+    ]
+    indexed = []
+
+    def index_file(file_path):
+        indexed.append(file_path)
+        return not file_path.endswith('rejected.pdf')
+
+    progress = Progress(len(jobs))
+    outcomes = run_pipeline(jobs, index_file, progress=progress)
+
+    assert outcomes == {
+        path('good.pdf'): 'indexed',
+        path('missing.pdf'): 'download',
+        path('broken.pdf'): 'extract',
+        path('rejected.pdf'): 'index',
+        path('local.pdf'): 'indexed',
+    }
+    assert sorted(indexed) == sorted([path('good.pdf'), path('rejected.pdf'), path('local.pdf')])
+    stages = progress.snapshot()["stages"]
+    # The local PDF skips the download stage
+    assert {stage: (counters["done"], counters["failed"]) for stage, counters in stages.items()} == {
+        'download': (3, 1), 'extract': (3, 1), 'index': (2, 1)
+    }
+    assert all(counters["waiting"] == counters["active"] == 0 for counters in stages.values())
+    assert not progress.snapshot()["running"]
+
+
+def test_failed_download_hook_fails_the_download(tmp_path, downloads):
+    downloads['https://storage.test/good'] = lambda file_path: write_pdf(file_path, 'Laptop reviews')
+
+    def on_download(file_path):
+        raise RuntimeError('manifest is read-only')
+
+    outcomes = run_pipeline(
+        [('https://storage.test/good', str(tmp_path / 'good.pdf'))], lambda file_path: True, on_download
+    )
+    assert outcomes == {str(tmp_path / 'good.pdf'): 'download'}
+
+
+def test_index_errors_are_contained(tmp_path):
+    write_pdf(tmp_path / 'a.pdf', 'First')
+    write_pdf(tmp_path / 'b.pdf', 'Second')
+
+    def index_file(file_path):
+        if file_path.endswith('a.pdf'):
+            raise ValueError('index is corrupt')
+        return True
+
+    outcomes = run_pipeline([(None, str(tmp_path / 'a.pdf')), (None, str(tmp_path / 'b.pdf'))], index_file)
+    assert outcomes == {str(tmp_path / 'a.pdf'): 'index', str(tmp_path / 'b.pdf'): 'indexed'}
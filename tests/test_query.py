@@ -0,0 +1,65 @@
+import pytest
+
+from query import (
+    And, Field, Fuzzy, Not, Or, Phrase, Prefix, QuerySyntaxError, Term,
+    fuzzy_query, is_advanced, parse_query, term_spans
+)
+
+
+@pytest.mark.parametrize('query, tree', [
+    ('laptop', Term('laptop')),
+    ('a b', And((Term('a'), Term('b')))),
+    ('a AND b', And((Term('a'), Term('b')))),
+    # AND binds tighter than OR
+    ('a OR b c', Or((Term('a'), And((Term('b'), Term('c')))))),
+    ('a b OR c', Or((And((Term('a'), Term('b'))), Term('c')))),
+    ('(a OR b) c', And((Or((Term('a'), Term('b'))), Term('c')))),
+    ('a -b', And((Term('a'), Not(Term('b'))))),
+    ('a NOT b', And((Term('a'), Not(Term('b'))))),
+    ('NOT NOT a', Not(Not(Term('a')))),
+    ('"Best Laptop"', Phrase(('best', 'laptop'))),
+    ('"laptop"', Term('laptop')),
+    ('e-mail', Phrase(('e', 'mail'))),
+    ('lap*', Prefix('lap')),
+    ('laptp~', Fuzzy('laptp')),
+    ('laptp~1', Fuzzy('laptp', 1)),
+    ('magazine:1000 laptop', And((Field('magazine', '1000'), Term('laptop')))),
+    ('Issue:3 a', And((Field('issue', '3'), Term('a')))),
+])
+def test_parse(query, tree):
+    assert parse_query(query) == tree
+
+
+@pytest.mark.parametrize('query', [
+    'a AND', 'a OR', '(a', 'a)', '""', 'magazine:', 'lap*top*', 'e-mail~', '*', 'AND b',
+])
+def test_parse_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize('query', [
+    'laptop', 'rock and roll', 'c++', 'ice)', '(ice', 'OR', 'NOT', 'a AND', '-based', '*', 'rock and roll)',
+])
+def test_plain_keywords(query):
+    assert not is_advanced(query)
+
+
+@pytest.mark.parametrize('query', [
+    'a OR b', 'a -b', '"a b"', 'lap*', 'laptp~', 'magazine:1 x',
+    # Malformed but clearly meant as queries: parsing reports the error
+    'a AND (b', 'NOT a)', 'magazine:1 (x', 'NOT a',
+])
+def test_advanced_queries(query):
+    assert is_advanced(query)
+
+
+def test_term_spans():
+    query = 'magazine:1 "Best laptp" OR lap* -servce~1 AND x'
+    assert [query[start:end] for start, end in term_spans(query)] == ['Best', 'laptp', 'servce', 'x']
+    plain = 'laptp or servce)'
+    assert [plain[start:end] for start, end in term_spans(plain)] == ['laptp', 'or', 'servce']
+
+
+def test_fuzzy_query():
+    assert fuzzy_query('Laptop, Review') == 'laptop~ review~'
@@ -0,0 +1,92 @@
+import pytest
+
+import search_index
+
+
+@pytest.mark.parametrize('keywords', [['the'], ['e'], ['the', 'laptop'], ['THE', 'the', 'ice-cold', '$99']])
+def test_batch_matches_single_searches(index, keywords):
+    batch = index.search_ranked_many(keywords, limit=100)
+    for keyword, result in zip(keywords, batch):
+        assert result == index.search_ranked(keyword, limit=100)
+
+
+def test_search_ranked_counts_each_line_once(index):
+    total, _, hits = index.search_ranked('the', limit=100)
+    assert total == len(hits) == len({hit[1] for hit in hits}) == 4
+
+
+@pytest.mark.parametrize('query, suggestion', [
+    ('laptp', 'laptop'),
+    ('Laptp Reviws', 'Laptop Reviews'),
+    ('laptp OR servce', 'laptop OR service'),
+    ('"the bset" -laptp', '"the best" -laptop'),
+    ('magazine:1000 laptp', 'magazine:1000 laptop'),
+    ('lapt* servce~1', 'lapt* service~1'),
+])
+def test_suggest_rewrites_only_search_words(index, query, suggestion):
+    assert index.suggest(query) == [suggestion]
+
+
+@pytest.mark.parametrize('query', ['laptop', 'laptop OR service', 'zzzzzzzzzz'])
+def test_suggest_nothing_to_correct(index, query):
+    assert index.suggest(query) == []
+
+
+@pytest.mark.parametrize('query', ['yaer~', 'yera~', 'yar~1', 'fuortene~', 'forteen~'])
+def test_fuzzy_terms_shorter_than_their_trigram_filter(index, query):
+    # Edits that leave no trigram of the word in place: swaps in short words, two edits in eight letters
+    assert index.search_ranked(query, limit=10)[0] == 1
+
+
+def test_fuzzy_terms_expand_once_within_their_bound(index, monkeypatch):
+    calls = []
+    fuzzy_terms = search_index._fuzzy_terms
+
+    def recording_fuzzy_terms(conn, word, max_edits=None):
+        calls.append((word, max_edits))
+        return fuzzy_terms(conn, word, max_edits)
+
+    monkeypatch.setattr(search_index, '_fuzzy_terms', recording_fuzzy_terms)
+    assert index.search_ranked('servce~1 OR laptp~', limit=10)[0] == 2
+    assert calls == [('servce', 1), ('laptp', None)]
+
+
+@pytest.mark.parametrize('keyword, scans', [('the', True), ('e', True), ('ice-cold', False), ('cat', False)])
+def test_common_keywords_scan_the_corpus(index, monkeypatch, keyword, scans):
+    monkeypatch.setattr(search_index, 'CORPUS_SCAN_RATIO', 1.0)
+    expected = index.search_ranked(keyword, limit=100), list(index.iter_search(keyword))
+    scanned = []
+    corpus = index.corpus
+
+    def recording_corpus():
+        scanned.append(keyword)
+        return corpus()
+
+    monkeypatch.setattr(search_index, 'CORPUS_SCAN_RATIO', 0.5)
+    monkeypatch.setattr(index, 'corpus', recording_corpus)
+    assert (index.search_ranked(keyword, limit=100), list(index.iter_search(keyword))) == expected
+    assert index.search_ranked_many([keyword], limit=100) == [expected[0]]
+    assert bool(scanned) == scans
+
+
+def test_schema_rebuild_discards_corpus(index, monkeypatch):
+    assert list(index.corpus().find('$99'))
+    old_version = index.corpus_version()
+    monkeypatch.setattr('search_index.SCHEMA_VERSION', -1)
+    rebuilt = type(index)(index.path)
+    assert rebuilt.corpus_version() > old_version
+    assert list(rebuilt.corpus().find('$99')) == []
+
+
+def test_long_keywords(index):
+    line = 'one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen seventeen eighteen'
+    assert index.search_ranked(line, limit=10)[0] == 1
+    assert index.search_ranked(line.replace('eighteen', 'nineteen'), limit=10)[0] == 0
+    assert index.search_ranked(' '.join(['the'] * 600), limit=10)[0] == 0
+    assert index.search_ranked_many([line, ' '.join(f'w{i}' for i in range(600))], limit=10)[0][0] == 1
+
+
+@pytest.mark.parametrize('keyword, total', [('ice)', 1), ('$99 (ice', 1), ('OR', 1), ('-based', 0)])
+def test_malformed_queries_search_as_text(index, keyword, total):
+    assert index.search_ranked(keyword, limit=100)[0] == total
+    assert index.search_ranked_many([keyword], limit=100)[0][0] == total
@@ -0,0 +1,140 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import pymupdf
+import pytest
+
+import index
+import pipeline
+from manifest import Manifest
+from pdf_cache import PdfCache
+from search_index import SearchIndex
+
+
+def write_pdf(file_path, text):
+    document = pymupdf.open()
+    document.new_page().insert_text((72, 72), text)
+    document.save(str(file_path))
+
+
+def catalog_of(*filenames):
+    """Catalog issues for '<magazine>_<issue>.pdf' filenames, stored in the bucket under the filename"""
+    issues = {}
+    for filename in filenames:
+        magazine_id, issue_number = filename[:-len('.pdf')].split('_')
+        issues[f"issue-{magazine_id}-{issue_number}"] = {
+            'magazineId': magazine_id, 'issueNumber': issue_number, 'pdfFileId': filename
+        }
+    return issues
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    """
+    index.sync_magazines against throwaway data: set .issues to the catalog, put
+    PDFs in .bucket to make them downloadable, and read .downloads for what was fetched.
+    """
+    magazines_dir = tmp_path / 'magazines'
+    bucket = tmp_path / 'bucket'
+    magazines_dir.mkdir()
+    bucket.mkdir()
+    search_index = SearchIndex(str(tmp_path / 'search_index.sqlite'))
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite'))
+    state = SimpleNamespace(
+        issues={}, downloads=[], bucket=bucket, magazines_dir=magazines_dir,
+        search_index=search_index, manifest=manifest
+    )
+
+    def download_file(http, url, file_path):
+        file_id = url.split('/files/')[1].split('/')[0]
+        state.downloads.append(file_id)
+        if not (bucket / file_id).exists():
+            return False
+        shutil.copyfile(bucket / file_id, file_path)
+        return True
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    monkeypatch.setattr(index, 'MAGAZINES_DIR', str(magazines_dir))
+    monkeypatch.setattr(index, 'search_index', search_index)
+    monkeypatch.setattr(index, 'manifest', manifest)
+    monkeypatch.setattr(index, 'pdf_cache', PdfCache(manifest, str(magazines_dir), 0))
+    monkeypatch.setattr(index, 'catalog', SimpleNamespace(refresh=lambda: SimpleNamespace(magazine_issues=state.issues)))
+    state.run = lambda: index.sync_magazines()["changes"]
+    return state
+
+
+def test_sync_downloads_and_indexes_new_issues(sync):
+    write_pdf(sync.bucket / '1000_1.pdf', 'Laptop reviews')
+    sync.issues = catalog_of('1000_1.pdf')
+    changes = sync.run()
+    assert changes["added"] == ['1000_1.pdf']
+    assert sync.search_index.search_ranked('laptop', 10)[0] == 1
+
+    assert sync.run()["unchanged"] == 1
+    assert sync.downloads == ['1000_1.pdf']
+
+
+def test_sync_adopts_and_indexes_local_pdfs_without_downloading(sync):
+    write_pdf(sync.magazines_dir / '1000_1.pdf', 'Laptop reviews')
+    sync.issues = catalog_of('1000_1.pdf')
+    changes = sync.run()
+    assert changes["reindexed"] == ['1000_1.pdf']
+    assert '1000_1.pdf' in sync.manifest.entries()
+    assert sync.search_index.search_ranked('laptop', 10)[0] == 1
+    assert sync.downloads == []
+
+
+def test_sync_reindexes_local_pdfs_missing_from_the_index(sync):
+    write_pdf(sync.bucket / '1000_1.pdf', 'Laptop reviews')
+    sync.issues = catalog_of('1000_1.pdf')
+    sync.run()
+    # e.g. a schema rebuild emptied the index
+    sync.search_index.remove_file('1000_1.pdf')
+
+    changes = sync.run()
+    assert changes["reindexed"] == ['1000_1.pdf']
+    assert changes["unchanged"] == 0
+    assert sync.search_index.search_ranked('laptop', 10)[0] == 1
+    assert sync.downloads == ['1000_1.pdf']
+
+
+def test_sync_retries_files_that_failed_to_index(sync, monkeypatch):
+    write_pdf(sync.bucket / '1000_1.pdf', 'Laptop reviews')
+    sync.issues = catalog_of('1000_1.pdf')
+    index_file = sync.search_index.index_file
+    monkeypatch.setattr(sync.search_index, 'index_file', lambda file_path: False)
+    stats = index.sync_magazines()
+    assert stats["changes"]["failed"] == ['1000_1.pdf']
+    assert stats["changes"]["added"] == []
+    assert stats["new_downloads"] == 0
+
+    # The next sync indexes the PDF it already downloaded
+    monkeypatch.setattr(sync.search_index, 'index_file', index_file)
+    changes = sync.run()
+    assert changes["reindexed"] == ['1000_1.pdf']
+    assert sync.search_index.search_ranked('laptop', 10)[0] == 1
+    assert sync.downloads == ['1000_1.pdf']
+
+
+def test_sync_reports_failed_downloads(sync):
+    sync.issues = catalog_of('1000_1.pdf')
+    changes = sync.run()
+    assert changes["failed"] == ['1000_1.pdf']
+    assert '1000_1.pdf' not in sync.manifest.entries()
+
+
+def test_sync_prunes_issues_gone_from_the_catalog(sync):
+    write_pdf(sync.bucket / '1000_1.pdf', 'Laptop reviews')
+    write_pdf(sync.bucket / '1001_2.pdf', 'Server racks')
+    sync.issues = catalog_of('1000_1.pdf', '1001_2.pdf')
+    sync.run()
+
+    sync.issues = catalog_of('1001_2.pdf')
+    changes = sync.run()
+    assert changes["removed"] == ['1000_1.pdf']
+    assert not os.path.exists(sync.magazines_dir / '1000_1.pdf')
+    assert '1000_1.pdf' not in sync.search_index.indexed_files()
+    assert '1000_1.pdf' not in sync.manifest.entries()
+    assert sync.search_index.search_ranked('laptop', 10)[0] == 0
+    assert sync.search_index.search_ranked('server', 10)[0] == 1
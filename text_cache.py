@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import contextmanager
+from concurrent.futures import Executor
+from typing import Dict, Iterator, List, Optional
+
+from pdf_text import engine_name, iter_extract
+from settings import INDEX_DIR
+
+# Bump whenever the layout changes; older caches are discarded
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contents (
+    sha256 TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    PRIMARY KEY (sha256, engine)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    sha256 TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (sha256, engine, page_number)
+) WITHOUT ROWID;
+"""
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file in chunks so large PDFs are never loaded whole"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TextCache:
+    """
+    Page-level cache of extracted PDF text, per extraction engine.
+    Files are matched by size and mtime first; the content hash is only
+    recomputed when those change, so renamed or re-downloaded copies of the
+    same PDF are still served from the cache.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(INDEX_DIR, 'text_cache.sqlite')
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                for table in ('pages', 'contents', 'files'):
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def content_hash(self, file_path: str) -> str:
+        """Return the sha256 of a file, reusing the stored hash while size/mtime are unchanged"""
+        key = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self._connect() as conn:
+            row = conn.execute('SELECT size, mtime, sha256 FROM files WHERE path = ?', (key,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        sha256 = file_sha256(file_path)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO files (path, size, mtime, sha256) VALUES (?, ?, ?, ?)',
+                (key, stat.st_size, stat.st_mtime, sha256)
+            )
+        return sha256
+
+    def _is_cached(self, sha256: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT page_count, (SELECT COUNT(*) FROM pages WHERE sha256 = c.sha256 AND engine = c.engine) '
+                'FROM contents c WHERE sha256 = ? AND engine = ?',
+                (sha256, engine_name())
+            ).fetchone()
+        return row is not None and row[0] == row[1]
+
+    def _iter_cached(self, sha256: str) -> Iterator[str]:
+        """Yield cached page texts in order, one row at a time"""
+        engine = engine_name()
+        with self._connect() as conn:
+            for (text,) in conn.execute(
+                'SELECT text FROM pages WHERE sha256 = ? AND engine = ? ORDER BY page_number',
+                (sha256, engine)
+            ):
+                yield text
+
+    def _clear(self, sha256: str):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM contents WHERE sha256 = ? AND engine = ?', (sha256, engine_name()))
+            conn.execute('DELETE FROM pages WHERE sha256 = ? AND engine = ?', (sha256, engine_name()))
+
+    def _store_pages(self, sha256: str, first_page: int, texts: List[str]):
+        engine = engine_name()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO pages (sha256, engine, page_number, text) VALUES (?, ?, ?, ?)',
+                [(sha256, engine, page_num, text) for page_num, text in enumerate(texts, start=first_page)]
+            )
+
+    def _complete(self, sha256: str, page_count: int):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO contents (sha256, engine, page_count) VALUES (?, ?, ?)',
+                (sha256, engine_name(), page_count)
+            )
+
+    def cache_many(self, file_paths: List[str], pool: Optional[Executor] = None) -> Dict[str, str]:
+        """
+        Make sure every PDF's text is cached and return {file_path: sha256} for the
+        ones that are. Misses are extracted in parallel (on `pool` if given) and written
+        to the cache a page range at a time, so no file is ever held in memory whole.
+        """
+        hashes = {file_path: self.content_hash(file_path) for file_path in file_paths}
+        misses = [file_path for file_path, sha256 in hashes.items() if not self._is_cached(sha256)]
+        failed = set()
+        next_page: Dict[str, int] = {}
+        for kind, file_path, value in iter_extract(misses, pool=pool):
+            sha256 = hashes[file_path]
+            if kind == 'pages':
+                if file_path not in next_page:
+                    self._clear(sha256)
+                    next_page[file_path] = 1
+                self._store_pages(sha256, next_page[file_path], value)
+                next_page[file_path] += len(value)
+            elif kind == 'done':
+                self._complete(sha256, next_page.pop(file_path, 1) - 1)
+            else:
+                failed.add(file_path)
+                if next_page.pop(file_path, None) is not None:
+                    self._clear(sha256)
+        return {file_path: sha256 for file_path, sha256 in hashes.items() if file_path not in failed}
+
+    def iter_page_texts(self, file_path: str) -> Iterator[str]:
+        """
+        Return an iterator over a PDF's page texts. Extraction (on a miss) happens
+        before this returns; pages are then read back from the cache one at a time.
+        """
+        cached = self.cache_many([file_path])
+        if file_path not in cached:
+            raise ValueError(f"Could not extract text from {os.path.basename(file_path)}")
+        return self._iter_cached(cached[file_path])
+
+
+_text_cache = None
+
+
+def _get_text_cache() -> TextCache:
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
+
+
+def iter_page_texts(file_path: str) -> Iterator[str]:
+    """Stream cached page texts for a PDF, extracting it first on a miss"""
+    return _get_text_cache().iter_page_texts(file_path)
+
+
+def cache_many(file_paths: List[str], pool: Optional[Executor] = None) -> Dict[str, str]:
+    """Cache the text of several PDFs, extracting misses in parallel; returns {path: sha256} for successes"""
+    return _get_text_cache().cache_many(file_paths, pool)